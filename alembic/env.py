@@ -1,8 +1,11 @@
 import asyncio
 from logging.config import fileConfig
 
+from typing import Optional
+
 from sqlalchemy import pool
 from sqlalchemy.engine import Connection
+from sqlalchemy.sql.schema import SchemaItem
 from sqlalchemy.ext.asyncio import async_engine_from_config
 
 from alembic import context
@@ -60,7 +63,27 @@ def run_migrations_offline() -> None:
 
 
 def do_run_migrations(connection: Connection) -> None:
-    context.configure(connection=connection, target_metadata=target_metadata)
+    extensions = set(connection.exec_driver_sql("SELECT extname FROM pg_extension").scalars())
+
+    def include_object(
+        object: SchemaItem,
+        name: Optional[str],
+        type_: str,
+        reflected: bool,
+        compare_to: Optional[SchemaItem]
+    ) -> bool:
+        # Индексы, которым нужно отсутствующее расширение (pg_trgm), миграции
+        # не создают — autogenerate не должен считать их пропавшими
+        if type_ == "index" and not reflected:
+            required = object.info.get("requires_extension")
+            return required is None or required in extensions
+        return True
+
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_object=include_object
+    )
 
     with context.begin_transaction():
         context.run_migrations()
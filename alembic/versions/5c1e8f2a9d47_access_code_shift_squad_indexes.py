@@ -0,0 +1,53 @@
+"""access_code shift/squad indexes
+
+Revision ID: 5c1e8f2a9d47
+Revises: 149d8a14e7da
+Create Date: 2026-10-17 10:12:41.220513
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1e8f2a9d47'
+down_revision: Union[str, None] = '149d8a14e7da'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Индексы строятся CONCURRENTLY, чтобы не блокировать выдачу кодов на большой таблице
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_access_code_shift_squad',
+            'access_code',
+            ['shift_number', 'squad_number'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_access_code_unused_shift_squad',
+            'access_code',
+            ['shift_number', 'squad_number'],
+            unique=False,
+            postgresql_where=sa.text('NOT is_used'),
+            postgresql_include=['code'],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_access_code_unused_shift_squad',
+            table_name='access_code',
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'ix_access_code_shift_squad',
+            table_name='access_code',
+            postgresql_concurrently=True,
+        )
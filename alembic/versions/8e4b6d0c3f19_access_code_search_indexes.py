@@ -0,0 +1,60 @@
+"""access_code search indexes
+
+Revision ID: 8e4b6d0c3f19
+Revises: 5c1e8f2a9d47
+Create Date: 2026-10-17 11:40:03.518274
+
+"""
+import logging
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e4b6d0c3f19'
+down_revision: Union[str, None] = '5c1e8f2a9d47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        # Префиксный поиск работает на любой базе
+        op.execute(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_access_code_code_lower_prefix '
+            'ON access_code (lower(code) text_pattern_ops)'
+        )
+        op.execute(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_access_code_full_name_lower_prefix '
+            'ON access_code (lower(full_name) text_pattern_ops)'
+        )
+
+        # pg_trgm может быть недоступен (нет пакета contrib или прав) —
+        # тогда триграммные индексы не создаются и поиск подстроки идёт без индекса
+        try:
+            op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        except sa.exc.DBAPIError:
+            logger.warning("pg_trgm is not available, skipping trigram indexes")
+            return
+
+        op.execute(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_access_code_code_trgm '
+            'ON access_code USING gin (code gin_trgm_ops)'
+        )
+        op.execute(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_access_code_full_name_trgm '
+            'ON access_code USING gin (full_name gin_trgm_ops)'
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_access_code_full_name_trgm')
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_access_code_code_trgm')
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_access_code_full_name_lower_prefix')
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_access_code_code_lower_prefix')
+    # Расширение pg_trgm не удаляем: им могут пользоваться другие объекты базы
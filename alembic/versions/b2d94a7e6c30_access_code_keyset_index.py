@@ -0,0 +1,38 @@
+"""access_code keyset index
+
+Revision ID: b2d94a7e6c30
+Revises: 8e4b6d0c3f19
+Create Date: 2026-10-17 12:25:37.904116
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b2d94a7e6c30'
+down_revision: Union[str, None] = '8e4b6d0c3f19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_access_code_created_at_id',
+            'access_code',
+            ['created_at', 'id'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_access_code_created_at_id',
+            table_name='access_code',
+            postgresql_concurrently=True,
+        )
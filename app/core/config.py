@@ -1,4 +1,4 @@
-from typing import List, Union
+from typing import List, Literal, Union
 from pydantic_settings import BaseSettings
 from pydantic import AnyHttpUrl, validator
 
@@ -25,6 +25,16 @@ class Settings(BaseSettings):
     POSTGRES_PASSWORD: str = "postgres"
     POSTGRES_DB: str = "svmedia"
     DATABASE_URL: str = f"postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_SERVER}:5432/{POSTGRES_DB}"
+    DB_ECHO: bool = False
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    # SELECT 1 при каждой выдаче соединения; по умолчанию выключено — от разрывов
+    # простаивающих соединений защищает DB_POOL_RECYCLE
+    DB_POOL_PRE_PING: bool = False
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    DB_STATEMENT_TIMEOUT_MS: int = 15000
 
     # AWS S3 / Selectel Object Storage
     AWS_ACCESS_KEY_ID: str = "minioadmin"
@@ -32,12 +42,58 @@ class Settings(BaseSettings):
     AWS_BUCKET_NAME: str = "svmedia-s3"
     AWS_ENDPOINT_URL: str = "http://localhost:9000"
     AWS_REGION: str = "ru-3"
+    S3_MAX_POOL_CONNECTIONS: int = 50
+    S3_CONNECT_TIMEOUT: float = 5.0
+    S3_READ_TIMEOUT: float = 30.0
+    S3_KEEPALIVE_TIMEOUT: float = 60.0
+    ARCHIVE_CACHE_TTL_SECONDS: int = 300
+    DOWNLOAD_URL_EXPIRES_SECONDS: int = 86400
+    # prebuilt — готовые shifts/{shift}_{squad}.zip, stream — сборка ZIP на лету
+    # из фотографий под {shift}/{squad}/ и {shift}/total/
+    ARCHIVE_MODE: Literal["prebuilt", "stream"] = "prebuilt"
+    ARCHIVE_STREAM_CHUNK_SIZE: int = 1024 * 1024
+    ARCHIVE_STREAM_CONCURRENCY: int = 8
+    # Сколько архивов собирается на лету одновременно (по потоку на архив)
+    ARCHIVE_STREAM_WORKERS: int = 8
+    PUBLIC_BASE_URL: str = ""
 
     # JWT
     SECRET_KEY: str = "your-secret-key-here"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 30
+    PRINCIPAL_CACHE_MAX_SIZE: int = 1024
+    PASSWORD_HASH_WORKERS: int = 4
     DOWNLOADS_ENABLED: bool = False
+    # Ограничение частоты активаций кодов (token bucket)
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: Literal["memory", "redis"] = "memory"
+    RATE_LIMIT_REDIS_URL: str = "redis://localhost:6379/0"
+    # Лимит по IP общий для всех клиентов за одним NAT (Wi-Fi лагеря, мобильный
+    # оператор), поэтому он заметно выше лимита по коду
+    RATE_LIMIT_IP_CAPACITY: int = 60
+    RATE_LIMIT_IP_PER_MINUTE: float = 30
+    RATE_LIMIT_CODE_CAPACITY: int = 5
+    RATE_LIMIT_CODE_PER_MINUTE: float = 2
+    # Сколько помнить, что код с исчерпанным лимитом ещё не активирован
+    RATE_LIMIT_CODE_STATUS_TTL_SECONDS: int = 10
+    # Сколько обратных прокси перед приложением добавляют X-Forwarded-For
+    TRUSTED_PROXY_COUNT: int = 0
+
+    # Списки кодов
+    CODE_COUNT_CACHE_TTL_SECONDS: int = 60
+    SHIFT_STATS_CACHE_TTL_SECONDS: int = 10
+    # Фильтр Блума выданных кодов для быстрого отказа на несуществующих
+    CODE_FILTER_ENABLED: bool = True
+    CODE_FILTER_CAPACITY: int = 1_000_000
+    CODE_FILTER_ERROR_RATE: float = 0.001
+    CODE_FILTER_REFRESH_SECONDS: float = 30.0
+    CODE_FILTER_MISS_REFRESH_SECONDS: float = 1.0
+    # Полная пересборка подбирает коды, которые догрузка пропустила
+    # (транзакция зафиксирована позже, чем через REFRESH_OVERLAP)
+    CODE_FILTER_REBUILD_SECONDS: float = 3600.0
+    # Проверок в базе в секунду для кодов, которых нет в фильтре
+    CODE_FILTER_MISS_LOOKUPS_PER_SECOND: float = 5.0
 
     @property
     def SQLALCHEMY_DATABASE_URL(self) -> str:
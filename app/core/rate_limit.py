@@ -0,0 +1,249 @@
+import logging
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any, Optional, Protocol
+from starlette.requests import Request
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Ограничение частоты запросов по алгоритму token bucket: в корзине до `capacity`
+# жетонов, они восполняются со скоростью `refill_per_second`, каждый запрос
+# забирает жетон. Пустая корзина — отказ с Retry-After до появления жетона.
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    capacity: float
+    refill_per_second: float
+
+    @classmethod
+    def per_minute(cls, capacity: float, per_minute: float) -> "RateLimit":
+        return cls(capacity=capacity, refill_per_second=per_minute / 60)
+
+
+@dataclass(frozen=True)
+class RateLimitResult:
+    allowed: bool
+    retry_after: float = 0.0
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, key: str, retry_after: float) -> None:
+        self.key = key
+        self.retry_after = retry_after
+        super().__init__(f"Превышен лимит запросов для {key}")
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+def take_token(
+    tokens: float,
+    updated_at: float,
+    now: float,
+    limit: RateLimit,
+    cost: float = 1
+) -> tuple[float, RateLimitResult]:
+    """
+    Один шаг token bucket.
+    :return: Новое количество жетонов и результат (разрешён ли запрос)
+    """
+    tokens = min(limit.capacity, tokens + max(0.0, now - updated_at) * limit.refill_per_second)
+    if tokens >= cost:
+        return tokens - cost, RateLimitResult(allowed=True)
+    retry_after = (cost - tokens) / limit.refill_per_second if limit.refill_per_second > 0 else math.inf
+    return tokens, RateLimitResult(allowed=False, retry_after=retry_after)
+
+
+class RateLimitBackend(Protocol):
+    async def consume(self, key: str, limit: RateLimit, cost: float = 1) -> RateLimitResult:
+        ...
+
+    async def close(self) -> None:
+        ...
+
+
+class InMemoryRateLimitBackend:
+    """
+    Корзины в памяти процесса. Лимиты действуют на каждый воркер отдельно.
+    Число корзин ограничено: самые давние вытесняются (и при следующем
+    запросе начинают с полной корзины).
+    """
+
+    def __init__(self, maxsize: int = 100_000) -> None:
+        self.maxsize = maxsize
+        self._buckets: "OrderedDict[str, tuple[float, float]]" = OrderedDict()
+        self._lock = Lock()
+
+    async def consume(self, key: str, limit: RateLimit, cost: float = 1) -> RateLimitResult:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (limit.capacity, now))
+            tokens, result = take_token(tokens, updated_at, now, limit, cost)
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return result
+
+    async def close(self) -> None:
+        self._buckets.clear()
+
+
+# Тот же шаг token bucket атомарно на стороне Redis; время берётся у сервера,
+# чтобы часы воркеров не влияли на результат
+_TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(bucket[1]) or capacity
+local updated_at = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+elseif rate > 0 then
+    retry_after = (cost - tokens) / rate
+else
+    retry_after = -1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated_at', now)
+if rate > 0 then
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+end
+return {allowed, tostring(retry_after)}
+"""
+
+
+class SharedRateLimitBackend:
+    """
+    Корзины в общем хранилище (Redis): лимиты общие для всех воркеров и реплик.
+    Клиент должен поддерживать `eval(script, numkeys, *keys_and_args)`, как
+    redis.asyncio.Redis. Если хранилище недоступно, запрос пропускается:
+    ограничение не должно ломать активацию кодов.
+    """
+
+    def __init__(self, client: Any, prefix: str = "ratelimit:") -> None:
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str) -> "SharedRateLimitBackend":
+        try:
+            from redis import asyncio as redis_asyncio  # type: ignore
+        except ImportError as e:
+            raise RuntimeError(
+                "Для RATE_LIMIT_BACKEND=redis нужен пакет redis (pip install redis)"
+            ) from e
+        return cls(redis_asyncio.from_url(url))
+
+    async def consume(self, key: str, limit: RateLimit, cost: float = 1) -> RateLimitResult:
+        try:
+            allowed, retry_after = await self.client.eval(
+                _TOKEN_BUCKET_SCRIPT,
+                1,
+                self.prefix + key,
+                limit.capacity,
+                limit.refill_per_second,
+                cost
+            )
+        except Exception:
+            logger.warning("Rate limit backend unavailable, request allowed", exc_info=True)
+            return RateLimitResult(allowed=True)
+        retry_after = float(retry_after)
+        return RateLimitResult(
+            allowed=bool(int(allowed)),
+            retry_after=math.inf if retry_after < 0 else retry_after
+        )
+
+    async def close(self) -> None:
+        close = getattr(self.client, "aclose", None) or getattr(self.client, "close", None)
+        if close is not None:
+            await close()
+
+
+class RateLimiter:
+    def __init__(self, backend: RateLimitBackend, enabled: Optional[bool] = None) -> None:
+        self.backend = backend
+        # None — следовать settings.RATE_LIMIT_ENABLED (проверяется на каждом запросе)
+        self._enabled = enabled
+
+    @property
+    def enabled(self) -> bool:
+        return settings.RATE_LIMIT_ENABLED if self._enabled is None else self._enabled
+
+    async def check(self, *rules: tuple[str, RateLimit]) -> None:
+        """
+        Забирает по жетону из каждой корзины.
+        :raises RateLimitExceeded: если хотя бы одна корзина пуста
+        """
+        if not self.enabled:
+            return
+        for key, limit in rules:
+            result = await self.backend.consume(key, limit)
+            if not result.allowed:
+                raise RateLimitExceeded(key, result.retry_after)
+
+    async def close(self) -> None:
+        await self.backend.close()
+
+
+_forwarded_without_proxy_logged = False
+
+
+def client_ip(request: Request) -> Optional[str]:
+    """
+    IP клиента. За TRUSTED_PROXY_COUNT обратными прокси берётся адрес,
+    который добавил ближайший к клиенту доверенный прокси в X-Forwarded-For.
+    """
+    global _forwarded_without_proxy_logged
+    if settings.TRUSTED_PROXY_COUNT == 0:
+        # X-Forwarded-For без доверенных прокси почти наверняка означает, что
+        # приложение стоит за прокси, а TRUSTED_PROXY_COUNT не задан: тогда все
+        # клиенты получают адрес прокси и делят один лимит по IP
+        if not _forwarded_without_proxy_logged and "x-forwarded-for" in request.headers:
+            _forwarded_without_proxy_logged = True
+            logger.error(
+                "X-Forwarded-For received but TRUSTED_PROXY_COUNT=0: client IPs resolve "
+                "to the proxy address %s and share one rate limit bucket. "
+                "Set TRUSTED_PROXY_COUNT to the number of reverse proxies.",
+                request.client.host if request.client else None
+            )
+    else:
+        forwarded = [
+            item.strip()
+            for item in request.headers.get("x-forwarded-for", "").split(",")
+            if item.strip()
+        ]
+        if len(forwarded) >= settings.TRUSTED_PROXY_COUNT:
+            return forwarded[-settings.TRUSTED_PROXY_COUNT]
+    return request.client.host if request.client else None
+
+
+def create_rate_limiter() -> RateLimiter:
+    backend: RateLimitBackend
+    if settings.RATE_LIMIT_BACKEND == "redis":
+        backend = SharedRateLimitBackend.from_url(settings.RATE_LIMIT_REDIS_URL)
+    else:
+        backend = InMemoryRateLimitBackend()
+    return RateLimiter(backend)
+
+
+rate_limiter = create_rate_limiter()
+
+REDEMPTION_IP_LIMIT = RateLimit.per_minute(
+    settings.RATE_LIMIT_IP_CAPACITY, settings.RATE_LIMIT_IP_PER_MINUTE
+)
+REDEMPTION_CODE_LIMIT = RateLimit.per_minute(
+    settings.RATE_LIMIT_CODE_CAPACITY, settings.RATE_LIMIT_CODE_PER_MINUTE
+)
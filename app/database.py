@@ -1,12 +1,158 @@
+import time
+from dataclasses import dataclass
+from typing import Any, Optional, cast
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, ExceptionContext, ExecutionContext
+from sqlalchemy.engine.interfaces import DBAPICursor
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.ext.asyncio import async_sessionmaker
 from sqlalchemy.orm import Mapped, mapped_column, DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry
 from app.core.config import settings
+from app.core.metrics import DB_QUERY_DURATION, CounterCallback, GaugeCallback, registry
 
-engine = create_async_engine(settings.DATABASE_URL, echo=True)
+
+@dataclass
+class PoolWaitStats:
+    """Счётчики ожидания соединений из пула (для подбора размера пула)."""
+    checkouts: int = 0
+    timeouts: int = 0
+    wait_seconds_total: float = 0.0
+    wait_seconds_max: float = 0.0
+
+    def record(self, waited: float) -> None:
+        self.checkouts += 1
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+
+pool_wait_stats = PoolWaitStats()
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Пул соединений, который замеряет время ожидания свободного соединения.
+    Время установки нового соединения (overflow) в ожидание не входит:
+    оно вычитается из общего времени выдачи.
+    """
+
+    def _create_connection(self) -> ConnectionPoolEntry:
+        started = time.perf_counter()
+        record = super()._create_connection()
+        record.connect_seconds = time.perf_counter() - started  # type: ignore[attr-defined]
+        return record
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        started = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except PoolTimeoutError:
+            pool_wait_stats.timeouts += 1
+            raise
+        elapsed = time.perf_counter() - started
+        # Записи переиспользуются: время соединения учитываем только один раз
+        connect_seconds = record.__dict__.pop("connect_seconds", 0.0)
+        pool_wait_stats.record(max(0.0, elapsed - connect_seconds))
+        return record
+
+
+engine = create_async_engine(
+    settings.DATABASE_URL,
+    echo=settings.DB_ECHO,
+    poolclass=InstrumentedQueuePool,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+    connect_args={
+        "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        "server_settings": {
+            "statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS),
+        },
+    },
+)
 async_session = async_sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
 
+
+def get_pool_status() -> dict[str, int | float]:
+    """Текущее состояние пула соединений и накопленная статистика ожидания."""
+    pool = cast(InstrumentedQueuePool, engine.pool)
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "checkouts": pool_wait_stats.checkouts,
+        "timeouts": pool_wait_stats.timeouts,
+        "wait_seconds_total": round(pool_wait_stats.wait_seconds_total, 6),
+        "wait_seconds_max": round(pool_wait_stats.wait_seconds_max, 6),
+    }
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _start_query_timer(
+    conn: Connection,
+    cursor: DBAPICursor,
+    statement: str,
+    parameters: Any,
+    context: Optional[ExecutionContext],
+    executemany: bool
+) -> None:
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _record_query_time(
+    conn: Connection,
+    cursor: DBAPICursor,
+    statement: str,
+    parameters: Any,
+    context: Optional[ExecutionContext],
+    executemany: bool
+) -> None:
+    started = conn.info["query_started"].pop()
+    DB_QUERY_DURATION.observe(
+        time.perf_counter() - started,
+        statement=statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "UNKNOWN"
+    )
+
+
+@event.listens_for(engine.sync_engine, "handle_error")
+def _discard_query_timer(exception_context: ExceptionContext) -> None:
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_started"):
+        connection.info["query_started"].pop()
+
+
+registry.register(GaugeCallback(
+    "db_pool_connections",
+    "Database pool state (size, checked_out, checked_in, overflow)",
+    lambda: {
+        (key,): value
+        for key, value in get_pool_status().items()
+        if key in ("size", "checked_out", "checked_in", "overflow")
+    },
+    labels=("state",),
+))
+registry.register(CounterCallback(
+    "db_pool_checkouts_total",
+    "Connections handed out by the pool",
+    lambda: pool_wait_stats.checkouts,
+))
+registry.register(CounterCallback(
+    "db_pool_timeouts_total",
+    "Pool checkouts that timed out waiting for a connection",
+    lambda: pool_wait_stats.timeouts,
+))
+registry.register(CounterCallback(
+    "db_pool_wait_seconds_total",
+    "Total time spent waiting for a pooled connection",
+    lambda: pool_wait_stats.wait_seconds_total,
+))
+
 class Base(DeclarativeBase):
     id: Mapped[int] = mapped_column(primary_key=True, index=True, autoincrement=True)
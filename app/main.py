@@ -1,7 +1,16 @@
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 import logging
 from app.core.config import settings
+from app.database import get_pool_status
+from app.core.metrics import MetricsMiddleware, registry
+from app.core.rate_limit import rate_limiter
+from media.archive_service import archive_service
+from codes.bloom import valid_codes
+from codes.jobs import generation_jobs
 from users.api.v1 import router as users_router
 from codes.api.v1 import router as codes_router
 from media.api.v1 import router as media_router
@@ -13,6 +22,9 @@ logging.basicConfig(
 )
 
 def configure_app(application: FastAPI) -> None:
+    # Метрики длительности запросов для /metrics
+    application.add_middleware(MetricsMiddleware)
+
     # Настройка CORS
     application.add_middleware(
         CORSMiddleware,
@@ -27,12 +39,27 @@ def configure_app(application: FastAPI) -> None:
     application.include_router(codes_router, prefix="/api")
     application.include_router(media_router, prefix="/api")
 
+@asynccontextmanager
+async def lifespan(application: FastAPI) -> AsyncGenerator[None, None]:
+    # Общий S3-клиент живёт всё время работы приложения
+    await archive_service.start()
+    # Фильтр выданных кодов собирается в фоне, не задерживая старт
+    await valid_codes.start()
+    try:
+        yield
+    finally:
+        await valid_codes.stop()
+        await generation_jobs.shutdown()
+        await archive_service.close()
+        await rate_limiter.close()
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
     description="API SVMedia",
     version="1.0.0",
     docs_url="/api/docs",
-    openapi_url="/api/openapi.json"
+    openapi_url="/api/openapi.json",
+    lifespan=lifespan
 )
 
 configure_app(app)
@@ -50,3 +77,17 @@ async def health_check() -> dict:
         "status": "healthy",
         "version": "1.0.0"
     }
+
+@app.get("/health/db")
+async def database_health() -> dict:
+    return {
+        "status": "healthy",
+        "pool": get_pool_status()
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics() -> PlainTextResponse:
+    return PlainTextResponse(
+        registry.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -0,0 +1,91 @@
+"""
+Память и доля ложных срабатываний фильтра выданных кодов (codes/bloom.py)
+в сравнении с точными множествами в памяти: set и отсортированный массив
+кодов фиксированной длины в одном bytes-буфере (поиск bisect).
+
+Ложные срабатывания меряются на кодах, которых точно нет среди выданных:
+именно они при переборе и опечатках дошли бы до базы.
+
+Запуск:
+    python benchmarks/bench_code_filter.py --codes 1000000 --probes 1000000
+"""
+import argparse
+import sys
+import time
+from bisect import bisect_left
+from typing import Any
+sys.path.append(".")  # Добавляем текущую директорию в PYTHONPATH
+
+from codes.bloom import BloomFilter
+from codes.services import CodeGenerator
+
+
+class SortedCodes:
+    """Отсортированные коды одинаковой длины подряд в одном буфере."""
+
+    def __init__(self, codes: list[str], length: int) -> None:
+        self.length = length
+        self.count = len(codes)
+        self.buffer = "".join(sorted(codes)).encode()
+
+    def _code(self, index: int) -> bytes:
+        return self.buffer[index * self.length:(index + 1) * self.length]
+
+    def __contains__(self, code: str) -> bool:
+        target = code.encode()
+        index = bisect_left(range(self.count), target, key=self._code)
+        return index < self.count and self._code(index) == target
+
+
+def set_size(codes: set[str]) -> int:
+    return sys.getsizeof(codes) + sum(sys.getsizeof(code) for code in codes)
+
+
+def timed_lookups(container: Any, probes: list[str]) -> tuple[int, float]:
+    started = time.perf_counter()
+    hits = sum(1 for code in probes if code in container)
+    return hits, (time.perf_counter() - started) / len(probes) * 1e9
+
+
+def main(count: int, probes_count: int, error_rate: float, length: int) -> None:
+    generator = CodeGenerator(length=length)
+    codes = set(generator.generate_codes_batch(count))
+    while len(codes) < count:
+        codes.update(generator.generate_codes_batch(count - len(codes)))
+    probes = [code for code in generator.generate_codes_batch(probes_count) if code not in codes]
+    members = list(codes)[:probes_count]
+    per_million = 1_000_000 / count
+
+    started = time.perf_counter()
+    bloom = BloomFilter(count, error_rate)
+    bloom.update(codes)
+    build = time.perf_counter() - started
+    sorted_codes = SortedCodes(list(codes), length)
+
+    print(f"{count} codes of {length} chars, {len(probes)} non-member probes")
+    print(
+        f"bloom        m={bloom.num_bits} bits k={bloom.num_hashes} "
+        f"target fp={error_rate} build={build:.1f}s"
+    )
+    print(f"{'structure':12} {'MiB/1M codes':>12} {'ns/lookup':>10} {'false pos.':>12} {'members ok':>10}")
+    for name, container, size in (
+        ("bloom", bloom, bloom.size_bytes),
+        ("sorted", sorted_codes, len(sorted_codes.buffer)),
+        ("set", codes, set_size(codes)),
+    ):
+        false_positives, ns = timed_lookups(container, probes)
+        found, _ = timed_lookups(container, members)
+        print(
+            f"{name:12} {size * per_million / 1024 / 1024:12.2f} {ns:10.0f} "
+            f"{false_positives / len(probes):12.5f} {found == len(members)!s:>10}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--codes", type=int, default=1_000_000)
+    parser.add_argument("--probes", type=int, default=1_000_000)
+    parser.add_argument("--error-rate", type=float, default=0.001)
+    parser.add_argument("--length", type=int, default=8)
+    args = parser.parse_args()
+    main(args.codes, args.probes, args.error_rate, args.length)
@@ -0,0 +1,51 @@
+"""
+Сравнение посимвольной генерации кодов (secrets.choice на каждый символ)
+с пакетной генерацией из одного буфера secrets.token_bytes.
+
+Дополнительно проверяется равномерность символов пакетного генератора
+(отношение самой частой и самой редкой буквы алфавита).
+
+Запуск:
+    python benchmarks/bench_code_generator.py --count 100000
+"""
+import argparse
+import sys
+import time
+from collections import Counter
+from typing import Callable
+sys.path.append(".")  # Добавляем текущую директорию в PYTHONPATH
+
+from codes.services import CodeGenerator
+
+
+def timed(label: str, count: int, func: Callable[[], list[str]]) -> float:
+    started = time.perf_counter()
+    codes = func()
+    elapsed = time.perf_counter() - started
+    assert len(codes) == count
+    print(f"{label:12} {elapsed * 1000:9.1f} ms  {count / elapsed:12,.0f} codes/s")
+    return elapsed
+
+
+def main(count: int, length: int) -> None:
+    generator = CodeGenerator(length=length)
+    print(f"Generating {count} codes of {length} chars, alphabet={len(generator.alphabet)}")
+
+    per_char = timed(
+        "per-char", count, lambda: [generator.generate_code() for _ in range(count)]
+    )
+    batched = timed("batched", count, lambda: generator.generate_codes_batch(count))
+    print(f"speedup      {per_char / batched:9.1f}x")
+
+    frequencies = Counter("".join(generator.generate_codes_batch(count)))
+    assert set(frequencies) <= set(generator.alphabet)
+    ratio = max(frequencies.values()) / min(frequencies.values())
+    print(f"uniformity   max/min char frequency = {ratio:.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--count", type=int, default=100_000)
+    parser.add_argument("--length", type=int, default=8)
+    args = parser.parse_args()
+    main(args.count, args.length)
@@ -0,0 +1,189 @@
+"""
+Задержка активации кодов во время всплеска логинов.
+
+Пока N логинов проверяют bcrypt-пароль через POST /api/users/login,
+несколько клиентов непрерывно активируют коды через настоящий
+POST /api/codes/{code}/use. Сравниваются три прогона: без логинов,
+с проверкой пароля прямо в корутине (как было раньше) и с
+verify_password_async в пуле потоков. Если event loop не блокируется,
+задержка активации во время всплеска остаётся близкой к прогону без логинов.
+
+Как и redemption_load.py, приложение запускается в этом же процессе
+(httpx + ASGITransport), база — Postgres из DATABASE_URL, S3 заменяется
+FakeS3Client. Данные создаются в отдельной «смене»; --cleanup удаляет их.
+
+Запуск:
+    python benchmarks/bench_login_burst.py --logins 50
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+import uuid
+from typing import Any, Callable, Coroutine
+sys.path.append(".")  # Добавляем текущую директорию в PYTHONPATH
+
+import httpx
+from sqlalchemy import delete
+
+import users.services
+from app.core.config import settings
+from app.database import async_session
+from app.main import app
+from codes.models import AccessCode
+from media.archive_service import archive_service
+from users.models import User
+from users.services import create_user, verify_password, verify_password_async
+from benchmarks.stubs import FakeS3Client
+
+SQUAD = 1
+
+
+async def blocking_verify(plain_password: str, hashed_password: str) -> bool:
+    return verify_password(plain_password, hashed_password)
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+async def run(
+    label: str,
+    client: httpx.AsyncClient,
+    verify: Callable[..., Coroutine[Any, Any, bool]],
+    codes: list[str],
+    shift: int,
+    credentials: dict[str, str],
+    logins: int,
+    redeemers: int,
+    idle: float
+) -> None:
+    users.services.verify_password_async = verify
+    pending = iter(codes)
+    latencies: list[float] = []
+    errors: dict[int, int] = {}
+    stop = asyncio.Event()
+
+    async def redeem() -> None:
+        while not stop.is_set():
+            code = next(pending, None)
+            if code is None:
+                return
+            started = time.perf_counter()
+            response = await client.post(
+                f"/api/codes/{code}/use",
+                json={
+                    "name": "Bench",
+                    "surname": "Login",
+                    "shift": shift,
+                    "group": SQUAD,
+                    "promocode": code,
+                    "agree": True,
+                },
+                headers={"Accept": "application/json"},
+            )
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors[response.status_code] = errors.get(response.status_code, 0) + 1
+
+    workers = [asyncio.create_task(redeem()) for _ in range(redeemers)]
+    await asyncio.sleep(0.05)
+
+    started = time.perf_counter()
+    if logins:
+        responses = await asyncio.gather(*(
+            client.post("/api/users/login", data=credentials) for _ in range(logins)
+        ))
+        failed = sum(response.status_code != 200 for response in responses)
+    else:
+        await asyncio.sleep(idle)
+        failed = 0
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await asyncio.gather(*workers)
+    users.services.verify_password_async = verify_password_async
+
+    if not latencies:
+        print(f"{label:10} no redemptions (increase --codes)")
+        return
+    print(
+        f"{label:10} logins={logins:4} in {elapsed * 1000:7.0f} ms | use_code n={len(latencies):5} "
+        f"p50={statistics.median(latencies) * 1000:6.1f} ms "
+        f"p99={percentile(latencies, 0.99) * 1000:6.1f} ms "
+        f"max={max(latencies) * 1000:6.1f} ms"
+        + (f" | login errors: {failed}" if failed else "")
+        + (f" | use_code errors: {errors}" if errors else "")
+    )
+
+
+async def main(args: argparse.Namespace) -> None:
+    shift = args.shift or random.randint(900_000, 999_999)
+    email = f"bench-{uuid.uuid4().hex[:8]}@example.com"
+    password = uuid.uuid4().hex
+    credentials = {"username": email, "password": password}
+
+    settings.DOWNLOADS_ENABLED = True
+    # Все активации идут с одного адреса — лимит по IP исказил бы замер
+    settings.RATE_LIMIT_ENABLED = False
+    fake_s3 = FakeS3Client(latency=args.s3_latency)
+    fake_s3.put(archive_service.squad_archive_key(shift, SQUAD), b"squad")
+    fake_s3.put(archive_service.total_archive_key(shift), b"total")
+
+    async with async_session() as db:
+        await create_user(db=db, email=email, password=password, is_admin=True)
+
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with app.router.lifespan_context(app):
+            await archive_service.close()
+            archive_service._client = fake_s3
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://bench", timeout=120
+            ) as client:
+                login = await client.post("/api/users/login", data=credentials)
+                login.raise_for_status()
+                generated = await client.post(
+                    "/api/codes/generate",
+                    params={"count": args.codes * 3, "squad_number": SQUAD, "shift_number": shift},
+                    headers={"Authorization": f"Bearer {login.json()['access_token']}"},
+                )
+                generated.raise_for_status()
+                codes = [item["code"] for item in generated.json()]
+
+                common = dict(
+                    client=client,
+                    shift=shift,
+                    credentials=credentials,
+                    redeemers=args.redeemers,
+                    idle=args.idle,
+                )
+                await run("no logins", verify=verify_password_async, codes=codes[:args.codes],
+                          logins=0, **common)
+                await run("blocking", verify=blocking_verify, codes=codes[args.codes:2 * args.codes],
+                          logins=args.logins, **common)
+                await run("offloaded", verify=verify_password_async, codes=codes[2 * args.codes:],
+                          logins=args.logins, **common)
+    finally:
+        if args.cleanup:
+            async with async_session() as db:
+                await db.execute(delete(AccessCode).where(AccessCode.shift_number == shift))
+                await db.execute(delete(User).where(User.email == email))
+                await db.commit()
+
+    print(f"\nshift={shift} redeemers={args.redeemers} fake S3 calls: {fake_s3.calls}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--codes", type=int, default=1000, help="кодов на каждый прогон")
+    parser.add_argument("--redeemers", type=int, default=4, help="параллельных клиентов активации")
+    parser.add_argument("--idle", type=float, default=1.0, help="длительность прогона без логинов, с")
+    parser.add_argument("--shift", type=int, default=None)
+    parser.add_argument("--s3-latency", type=float, default=0.02, help="задержка FakeS3Client, с")
+    parser.add_argument("--cleanup", action="store_true")
+    asyncio.run(main(parser.parse_args()))
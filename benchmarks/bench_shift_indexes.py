@@ -0,0 +1,117 @@
+"""
+Проверка планов запросов по смене/отряду на большой таблице access_code.
+
+Скрипт в одной транзакции наполняет таблицу синтетическими кодами
+(по умолчанию 1 000 000 строк), выполняет ANALYZE и показывает планы
+запросов use_code, /codes/shift/{n} и /codes/shift/{n}/print —
+сначала с индексами, затем без них. В конце транзакция откатывается,
+база остаётся нетронутой.
+
+Запуск (нужна мигрированная база из DATABASE_URL):
+    python benchmarks/bench_shift_indexes.py --rows 1000000 --shifts 40 --squads 12
+"""
+import argparse
+import asyncio
+import json
+import sys
+sys.path.append(".")  # Добавляем текущую директорию в PYTHONPATH
+
+from sqlalchemy import Select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
+from app.core.config import settings
+from codes.crud import shift_promocodes_query, unused_codes_by_squad_query
+from users.models import User
+
+NEW_INDEXES = ("ix_access_code_shift_squad", "ix_access_code_unused_shift_squad")
+SHIFT = 7
+
+
+def literal_sql(query: Select) -> str:
+    """SQL запроса из codes.crud с подставленными параметрами, для EXPLAIN через text()."""
+    sql = str(query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+    # Двоеточия в форматах to_char не должны читаться как параметры text()
+    return sql.replace(":", "\\:")
+
+
+# shift_list и shift_print — те же запросы, что выполняют /codes/shift/{n}
+# (json_agg) и /codes/shift/{n}/print (string_agg)
+QUERIES = {
+    "use_code": (
+        "SELECT id, shift_number, squad_number, is_used FROM access_code "
+        "WHERE code = :code FOR UPDATE"
+    ),
+    "shift_list": literal_sql(shift_promocodes_query(SHIFT)),
+    "shift_print": literal_sql(unused_codes_by_squad_query(SHIFT)),
+}
+
+
+async def seed(conn: AsyncConnection, rows: int, shifts: int, squads: int) -> None:
+    user_id = await conn.scalar(text(
+        f'INSERT INTO "{User.__tablename__}" (email, hashed_password, is_active, is_admin) '
+        "VALUES ('bench@example.com', '-', true, true) RETURNING id"
+    ))
+    await conn.execute(
+        text(
+            "INSERT INTO access_code "
+            "(code, is_used, created_by_id, shift_number, squad_number) "
+            "SELECT 'bench' || g, g % 3 = 0, :user_id, "
+            "1 + g % :shifts, 1 + (g / :shifts) % :squads "
+            "FROM generate_series(1, :rows) AS g"
+        ),
+        {"user_id": user_id, "rows": rows, "shifts": shifts, "squads": squads}
+    )
+    await conn.execute(text("ANALYZE access_code"))
+
+
+def summarize(plan: dict) -> tuple[list[str], float]:
+    nodes: list[str] = []
+
+    def walk(node: dict) -> None:
+        label = node["Node Type"]
+        if "Index Name" in node:
+            label += f" using {node['Index Name']}"
+        nodes.append(label)
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(plan["Plan"])
+    return nodes, plan["Execution Time"]
+
+
+async def explain_all(conn: AsyncConnection, title: str) -> None:
+    print(f"\n== {title}")
+    params = {"code": "bench424242"}
+    for name, sql in QUERIES.items():
+        raw = await conn.scalar(
+            text(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}"), params
+        )
+        plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]
+        nodes, elapsed = summarize(plan)
+        marker = "SEQ SCAN" if any(n.startswith("Seq Scan") for n in nodes) else "ok"
+        print(f"{name:12} {elapsed:9.2f} ms  [{marker}]  {' -> '.join(nodes)}")
+
+
+async def main(rows: int, shifts: int, squads: int) -> None:
+    engine = create_async_engine(settings.DATABASE_URL)
+    async with engine.connect() as conn:
+        trans = await conn.begin()
+        try:
+            print(f"Seeding {rows} rows ({shifts} shifts x {squads} squads)...")
+            await seed(conn, rows, shifts, squads)
+            await explain_all(conn, "with shift/squad indexes")
+            for index in NEW_INDEXES:
+                await conn.execute(text(f"DROP INDEX IF EXISTS {index}"))
+            await explain_all(conn, "without shift/squad indexes")
+        finally:
+            await trans.rollback()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--shifts", type=int, default=40)
+    parser.add_argument("--squads", type=int, default=12)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.shifts, args.squads))
@@ -0,0 +1,226 @@
+"""
+Нагрузочный бенчмарк горячих эндпоинтов: /codes/{code}/use, /codes/generate,
+/codes/ и /codes/shift/{n}[/print] с заданной конкурентностью.
+
+По умолчанию приложение запускается в этом же процессе (httpx + ASGITransport),
+база — Postgres из DATABASE_URL (локальный docker compose), S3 заменяется
+FakeS3Client с настраиваемой задержкой. SQLite не подходит: списание кода,
+генерация и сводки используют Postgres-специфичный SQL (FOR UPDATE в CTE,
+ON CONFLICT, json_agg). С --s3 real используется настроенное хранилище (MinIO),
+в нём должны лежать архивы shifts/{shift}_{squad}.zip и shifts/{shift}_total.zip.
+
+Для каждого сценария печатаются p50/p95/p99 и пропускная способность.
+Данные создаются в отдельной «смене» с большим номером; --cleanup удаляет их.
+
+Запуск:
+    python benchmarks/redemption_load.py --codes 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+sys.path.append(".")  # Добавляем текущую директорию в PYTHONPATH
+
+import httpx
+from sqlalchemy import delete
+
+from app.core.config import settings
+from app.database import async_session
+from app.main import app
+from codes.models import AccessCode
+from media.archive_service import archive_service
+from users.models import User
+from users.services import create_user
+from benchmarks.stubs import FakeS3Client
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    latencies: list[float] = field(default_factory=list)
+    errors: dict[int, int] = field(default_factory=dict)
+    elapsed: float = 0.0
+
+    def percentile(self, q: float) -> float:
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000
+
+    def report(self) -> str:
+        if not self.latencies:
+            return f"{self.name:14} no requests"
+        errors = ", ".join(f"{code}x{count}" for code, count in sorted(self.errors.items()))
+        return (
+            f"{self.name:14} n={len(self.latencies):6} "
+            f"p50={self.percentile(0.50):8.1f} ms p95={self.percentile(0.95):8.1f} ms "
+            f"p99={self.percentile(0.99):8.1f} ms mean={statistics.mean(self.latencies) * 1000:8.1f} ms "
+            f"rps={len(self.latencies) / self.elapsed:8.1f}"
+            + (f" errors: {errors}" if errors else "")
+        )
+
+
+async def run_scenario(
+    name: str,
+    requests: list[Callable[[], Awaitable[httpx.Response]]],
+    concurrency: int,
+    expected: tuple[int, ...] = (200,),
+) -> ScenarioResult:
+    result = ScenarioResult(name)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(send: Callable[[], Awaitable[httpx.Response]]) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            response = await send()
+            result.latencies.append(time.perf_counter() - started)
+            if response.status_code not in expected:
+                result.errors[response.status_code] = result.errors.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(send) for send in requests))
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+async def main(args: argparse.Namespace) -> None:
+    shift = args.shift or random.randint(900_000, 999_999)
+    squads = list(range(1, args.squads + 1))
+    email = f"bench-{uuid.uuid4().hex[:8]}@example.com"
+    password = uuid.uuid4().hex
+
+    settings.DOWNLOADS_ENABLED = True
+    # Все запросы идут с одного адреса и повторяют коды — лимиты исказили бы замеры
+    settings.RATE_LIMIT_ENABLED = False
+    fake_s3 = None
+    if args.s3 == "fake":
+        fake_s3 = FakeS3Client(latency=args.s3_latency)
+        for squad in squads:
+            fake_s3.put(archive_service.squad_archive_key(shift, squad), b"squad")
+        fake_s3.put(archive_service.total_archive_key(shift), b"total")
+
+    async with async_session() as db:
+        await create_user(db=db, email=email, password=password, is_admin=True)
+
+    results: list[ScenarioResult] = []
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with app.router.lifespan_context(app):
+            if fake_s3 is not None:
+                await archive_service.close()
+                archive_service._client = fake_s3
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://bench", timeout=60
+            ) as client:
+                login = await client.post(
+                    "/api/users/login", data={"username": email, "password": password}
+                )
+                login.raise_for_status()
+                headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+                per_squad = max(1, args.codes // len(squads))
+
+                def generate_for(squad: int) -> Callable[[], Awaitable[httpx.Response]]:
+                    return lambda: client.post(
+                        "/api/codes/generate",
+                        params={"count": per_squad, "squad_number": squad, "shift_number": shift},
+                        headers=headers,
+                    )
+
+                generate = await run_scenario(
+                    "generate",
+                    [generate_for(squad) for squad in squads],
+                    args.concurrency,
+                )
+                results.append(generate)
+
+                shift_view = await client.get(f"/api/codes/shift/{shift}", headers=headers)
+                shift_view.raise_for_status()
+                codes = [
+                    (squad["squad_number"], promocode["code"])
+                    for squad in shift_view.json()["squads"]
+                    for promocode in squad["promocodes"]
+                ]
+                random.shuffle(codes)
+
+                def redeem(squad: int, code: str) -> Callable[[], Awaitable[httpx.Response]]:
+                    return lambda: client.post(
+                        f"/api/codes/{code}/use",
+                        json={
+                            "name": "Bench",
+                            "surname": "User",
+                            "shift": shift,
+                            "group": squad,
+                            "promocode": code,
+                            "agree": True,
+                        },
+                    )
+
+                results.append(await run_scenario(
+                    "use_code", [redeem(squad, code) for squad, code in codes], args.concurrency
+                ))
+                # Повторное списание и несуществующие коды — отказные пути
+                results.append(await run_scenario(
+                    "use_code_used",
+                    [redeem(squad, code) for squad, code in codes[: args.requests]],
+                    args.concurrency,
+                    expected=(200, 400),
+                ))
+                results.append(await run_scenario(
+                    "use_code_404",
+                    [redeem(1, uuid.uuid4().hex[:8]) for _ in range(args.requests)],
+                    args.concurrency,
+                    expected=(404,),
+                ))
+
+                def get(path: str, **params: str | int) -> Callable[[], Awaitable[httpx.Response]]:
+                    return lambda: client.get(path, params=params, headers=headers)
+
+                results.append(await run_scenario(
+                    "list_codes",
+                    [get("/api/codes/", limit=100, total_mode="estimated") for _ in range(args.requests)],
+                    args.concurrency,
+                ))
+                results.append(await run_scenario(
+                    "list_search",
+                    [get("/api/codes/", search="Bench", limit=100) for _ in range(args.requests)],
+                    args.concurrency,
+                ))
+                results.append(await run_scenario(
+                    "shift",
+                    [get(f"/api/codes/shift/{shift}") for _ in range(args.requests)],
+                    args.concurrency,
+                ))
+                results.append(await run_scenario(
+                    "shift_print",
+                    [get(f"/api/codes/shift/{shift}/print") for _ in range(args.requests)],
+                    args.concurrency,
+                ))
+    finally:
+        if args.cleanup:
+            async with async_session() as db:
+                await db.execute(delete(AccessCode).where(AccessCode.shift_number == shift))
+                await db.execute(delete(User).where(User.email == email))
+                await db.commit()
+
+    print(f"\nshift={shift} squads={len(squads)} concurrency={args.concurrency} s3={args.s3}")
+    for result in results:
+        print(result.report())
+    if fake_s3 is not None:
+        print(f"fake S3 calls: {fake_s3.calls}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--codes", type=int, default=2000, help="сколько кодов сгенерировать и списать")
+    parser.add_argument("--squads", type=int, default=10)
+    parser.add_argument("--shift", type=int, default=None)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=500, help="запросов в сценариях чтения")
+    parser.add_argument("--s3", choices=("fake", "real"), default="fake")
+    parser.add_argument("--s3-latency", type=float, default=0.02, help="задержка FakeS3Client, с")
+    parser.add_argument("--cleanup", action="store_true")
+    asyncio.run(main(parser.parse_args()))
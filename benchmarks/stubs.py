@@ -0,0 +1,171 @@
+"""
+Локальные заменители внешних сервисов для бенчмарков.
+
+FakeRedis заменяет Redis для SharedRateLimitBackend: тот же шаг token bucket,
+но без Lua и сети (с настраиваемой задержкой).
+
+FakeS3Client повторяет ту часть интерфейса aiobotocore-клиента, которой
+пользуется ArchiveService, и добавляет настраиваемую задержку «сети»,
+чтобы холодный и тёплый пути отличались так же, как с настоящим хранилищем.
+"""
+import asyncio
+import hashlib
+import time
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator
+
+from botocore.exceptions import ClientError  # type: ignore
+
+from app.core.rate_limit import RateLimit, take_token
+
+
+class FakeBody:
+    def __init__(self, data: bytes) -> None:
+        self._data = data
+
+    async def read(self) -> bytes:
+        return self._data
+
+    def close(self) -> None:
+        pass
+
+
+class FakePaginator:
+    def __init__(self, client: "FakeS3Client", page_size: int) -> None:
+        self.client = client
+        self.page_size = page_size
+
+    async def paginate(
+        self, Bucket: str, Prefix: str = "", Delimiter: str = "", **kwargs: Any
+    ) -> AsyncIterator[dict]:
+        keys = sorted(key for key in self.client.objects if key.startswith(Prefix))
+        prefixes: list[str] = []
+        if Delimiter:
+            nested = [key for key in keys if Delimiter in key[len(Prefix):]]
+            prefixes = sorted({
+                Prefix + key[len(Prefix):].split(Delimiter, 1)[0] + Delimiter for key in nested
+            })
+            keys = [key for key in keys if key not in nested]
+        for start in range(0, max(len(keys), 1), self.page_size):
+            await self.client._network("list_objects_v2")
+            page = keys[start:start + self.page_size]
+            yield {
+                "KeyCount": len(page),
+                "CommonPrefixes": [{"Prefix": prefix} for prefix in prefixes] if start == 0 else [],
+                "Contents": [
+                    {
+                        "Key": key,
+                        "Size": self.client._head(key)["ContentLength"],
+                        "ETag": self.client._head(key)["ETag"],
+                        "LastModified": datetime.now(timezone.utc),
+                    }
+                    for key in page
+                ],
+            }
+
+
+class FakeS3Client:
+    def __init__(self, latency: float = 0.02, page_size: int = 1000) -> None:
+        self.latency = latency
+        self.page_size = page_size
+        self.objects: dict[str, bytes] = {}
+        self.metadata: dict[str, dict[str, str]] = {}
+        self.uploads: dict[str, dict[int, bytes]] = {}
+        self.calls: dict[str, int] = {}
+
+    def put(self, key: str, body: bytes) -> None:
+        self.objects[key] = body
+
+    async def _network(self, operation: str) -> None:
+        self.calls[operation] = self.calls.get(operation, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def _head(self, key: str) -> dict[str, Any]:
+        body = self.objects.get(key)
+        if body is None:
+            raise ClientError({"Error": {"Code": "404", "Message": "Not Found"}}, "HeadObject")
+        return {
+            "ETag": f'"{hashlib.md5(body).hexdigest()}"',
+            "ContentLength": len(body),
+            "LastModified": datetime.now(timezone.utc),
+            "Metadata": self.metadata.get(key, {}),
+        }
+
+    async def head_object(self, Bucket: str, Key: str) -> dict[str, Any]:
+        await self._network("head_object")
+        return self._head(Key)
+
+    async def generate_presigned_url(
+        self, operation: str, Params: dict[str, str], ExpiresIn: int
+    ) -> str:
+        self.calls["generate_presigned_url"] = self.calls.get("generate_presigned_url", 0) + 1
+        return f"https://s3.local/{Params['Bucket']}/{Params['Key']}?X-Amz-Expires={ExpiresIn}"
+
+    async def get_object(self, Bucket: str, Key: str, Range: str = "", IfMatch: str = "") -> dict[str, Any]:
+        await self._network("get_object")
+        head = self._head(Key)
+        if IfMatch and IfMatch.strip('"') != head["ETag"].strip('"'):
+            raise ClientError({"Error": {"Code": "PreconditionFailed"}}, "GetObject")
+        body = self.objects[Key]
+        if Range:
+            start, end = Range.removeprefix("bytes=").split("-")
+            body = body[int(start):int(end) + 1]
+        return {"Body": FakeBody(body), "ContentLength": len(body), "ETag": head["ETag"]}
+
+    def get_paginator(self, operation: str) -> FakePaginator:
+        return FakePaginator(self, self.page_size)
+
+    async def create_multipart_upload(
+        self, Bucket: str, Key: str, Metadata: dict[str, str] | None = None, **kwargs: Any
+    ) -> dict[str, Any]:
+        await self._network("create_multipart_upload")
+        upload_id = f"{Key}#{len(self.uploads)}"
+        self.uploads[upload_id] = {}
+        self.metadata[f"upload:{upload_id}"] = Metadata or {}
+        return {"UploadId": upload_id}
+
+    async def upload_part(
+        self, Bucket: str, Key: str, UploadId: str, PartNumber: int, Body: bytes
+    ) -> dict[str, Any]:
+        await self._network("upload_part")
+        self.uploads[UploadId][PartNumber] = Body
+        return {"ETag": f'"{hashlib.md5(Body).hexdigest()}"'}
+
+    async def complete_multipart_upload(
+        self, Bucket: str, Key: str, UploadId: str, MultipartUpload: dict[str, Any]
+    ) -> dict[str, Any]:
+        await self._network("complete_multipart_upload")
+        parts = self.uploads.pop(UploadId)
+        numbers = [part["PartNumber"] for part in MultipartUpload["Parts"]]
+        if numbers != sorted(parts):
+            raise ClientError({"Error": {"Code": "InvalidPartOrder"}}, "CompleteMultipartUpload")
+        self.objects[Key] = b"".join(parts[number] for number in numbers)
+        self.metadata[Key] = self.metadata.pop(f"upload:{UploadId}")
+        return {"Key": Key}
+
+    async def abort_multipart_upload(self, Bucket: str, Key: str, UploadId: str) -> dict[str, Any]:
+        await self._network("abort_multipart_upload")
+        self.uploads.pop(UploadId, None)
+        self.metadata.pop(f"upload:{UploadId}", None)
+        return {}
+
+
+class FakeRedis:
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.buckets: dict[str, tuple[float, float]] = {}
+
+    async def eval(self, script: str, numkeys: int, key: str, capacity: float, rate: float, cost: float) -> list:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        now = time.time()
+        limit = RateLimit(capacity=float(capacity), refill_per_second=float(rate))
+        tokens, updated_at = self.buckets.get(key, (limit.capacity, now))
+        tokens, result = take_token(tokens, updated_at, now, limit, float(cost))
+        self.buckets[key] = (tokens, now)
+        retry_after = -1 if result.retry_after == float("inf") else result.retry_after
+        return [int(result.allowed), str(retry_after)]
+
+    async def aclose(self) -> None:
+        self.buckets.clear()
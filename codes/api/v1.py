@@ -1,35 +1,72 @@
-from typing import List, Sequence
-from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi.responses import HTMLResponse, PlainTextResponse
+from typing import Dict, List, Optional, Sequence
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import HTMLResponse, PlainTextResponse, Response, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, not_, update
+from sqlalchemy import select
 from app.dependency import get_db
 from app.core.config import settings
+from app.core.metrics import REDEMPTIONS
+from app.core.rate_limit import (
+    REDEMPTION_CODE_LIMIT,
+    REDEMPTION_IP_LIMIT,
+    RateLimitExceeded,
+    client_ip,
+    rate_limiter
+)
 from users.services import get_current_user
-from users.models import User
+from users.schemas import Principal
 from codes.models import AccessCode
 from codes.schemas import (
     AccessCodeResponse,
     AccessCodeList,
+    DownloadLinks,
     FormData,
+    GenerationJobCreate,
+    GenerationJobResponse,
     ShiftPromocodesResponse,
-    SquadPromocodes
+    ShiftStatsResponse
+)
+from codes.services import CodeSpaceExhaustedError, code_generator
+from codes.bloom import valid_codes
+from codes.jobs import GenerationJob, generation_jobs
+from codes.crud import (
+    after_cursor,
+    claim_access_code,
+    code_search_filter,
+    count_codes,
+    encode_cursor,
+    get_shift_promocodes_json,
+    get_shift_stats,
+    get_unused_codes_by_squad,
+    invalidate_shift_stats,
+    is_code_used,
+    remember_code_used
 )
-from codes.services import code_generator
-from media.archive_service import archive_service
-from datetime import datetime, timezone
+from codes.enums import ExportFormat, RedemptionStatus, SearchMode, TotalCountMode
+from codes.export import MEDIA_TYPES, export_shift_codes
+from codes.download_page import prefers_json, render_download_page
+from media.archive_service import archive_service, ArchiveNotFoundError
+from datetime import datetime, timedelta, timezone
+import hashlib
+import json
 import logging
 
 router = APIRouter(prefix="/codes", tags=["codes"])
 
 logger = logging.getLogger(__name__)
 
+_ARCHIVE_TITLES = {
+    "squad_archive": "архив отряда",
+    "total_archive": "общий архив смены",
+}
+
 @router.post("/generate", response_model=List[AccessCodeResponse])
 async def generate_codes(
+    response: Response,
     count: int = Query(..., gt=0),
     squad_number: int = Query(..., gt=0),
     shift_number: int = Query(..., gt=0),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ) -> List[AccessCode]:
     """
@@ -40,6 +77,9 @@ async def generate_codes(
         count: количество генерируемых кодов
         squad_number: номер отряда
         shift_number: номер смены
+
+    Статистика генерации возвращается в заголовках X-Codes-Rounds и X-Codes-Collisions.
+    Если уникальные коды не удалось подобрать за отведённое число попыток, возвращается 503.
     """
     if not current_user.is_admin:
         raise HTTPException(
@@ -47,27 +87,104 @@ async def generate_codes(
             detail="Только администраторы могут генерировать коды"
         )
     
-    codes = await code_generator.generate_multiple_codes(
-        count=count,
-        user=current_user,
-        db=db,
-        squad_number=squad_number,
-        shift_number=shift_number
+    try:
+        result = await code_generator.generate_codes(
+            count=count,
+            user=current_user,
+            db=db,
+            squad_number=squad_number,
+            shift_number=shift_number
+        )
+    except CodeSpaceExhaustedError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e)
+        )
+    response.headers["X-Codes-Rounds"] = str(result.rounds)
+    response.headers["X-Codes-Collisions"] = str(result.collisions)
+    return result.codes
+
+@router.post("/generate/jobs", response_model=GenerationJobResponse, status_code=202)
+async def create_generation_job(
+    job_data: GenerationJobCreate,
+    current_user: Principal = Depends(get_current_user)
+) -> GenerationJob:
+    """
+    Запускает фоновую генерацию кодов для всей смены по плану «отряд → количество».
+    Прогресс доступен через GET /codes/generate/jobs/{job_id}.
+    Только для администраторов.
+    """
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=403,
+            detail="Только администраторы могут генерировать коды"
+        )
+
+    return generation_jobs.submit(
+        shift_number=job_data.shift_number,
+        plan=job_data.squads,
+        user=current_user
     )
-    return codes
+
+@router.get("/generate/jobs", response_model=List[GenerationJobResponse])
+async def list_generation_jobs(
+    current_user: Principal = Depends(get_current_user)
+) -> List[GenerationJob]:
+    """
+    Список последних задач генерации кодов.
+    Только для администраторов.
+    """
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=403,
+            detail="Только администраторы могут генерировать коды"
+        )
+
+    return generation_jobs.list_jobs()
+
+@router.get("/generate/jobs/{job_id}", response_model=GenerationJobResponse)
+async def get_generation_job(
+    job_id: str,
+    current_user: Principal = Depends(get_current_user)
+) -> GenerationJob:
+    """
+    Статус и прогресс задачи генерации кодов.
+    Только для администраторов.
+    """
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=403,
+            detail="Только администраторы могут генерировать коды"
+        )
+
+    job = generation_jobs.get(job_id)
+    if not job:
+        raise HTTPException(
+            status_code=404,
+            detail="Задача не найдена"
+        )
+    return job
 
 @router.get("/", response_model=AccessCodeList)
 async def list_codes(
-    skip: int = 0,
-    limit: int = 100,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, gt=0, le=1000),
     search: str | None = None,
+    search_mode: SearchMode = SearchMode.SUBSTRING,
     is_used: bool | None = None,
-    current_user: User = Depends(get_current_user),
+    cursor: str | None = None,
+    total_mode: TotalCountMode = TotalCountMode.EXACT,
+    current_user: Principal = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
-) -> dict[str, Sequence[AccessCode] | int | None]:
+) -> dict[str, Sequence[AccessCode] | int | str | bool | None]:
     """
     Получает список всех кодов с возможностью фильтрации и поиска.
     Только для администраторов.
+
+    Для постраничного обхода больших списков передавайте `next_cursor`
+    из предыдущего ответа в `cursor` (skip при этом не используется),
+    а `total_mode=estimated` или `none` избавляет от полного COUNT на каждой странице.
+    `search_mode=prefix` ищет только по началу кода или ФИО — быстро на любой базе.
     """
     if not current_user.is_admin:
         raise HTTPException(
@@ -77,32 +194,52 @@ async def list_codes(
     
     query = select(AccessCode)
     
-    if search:
-        query = query.where(
-            (AccessCode.code.ilike(f"%{search}%")) |
-            (AccessCode.full_name.ilike(f"%{search}%"))
-        )
+    if search and search.strip():
+        query = query.where(code_search_filter(search, search_mode))
     
     if is_used is not None:
         query = query.where(AccessCode.is_used == is_used)
-    
-    query = query.offset(skip).limit(limit)
-    result = await db.execute(query)
+
+    total = await count_codes(
+        db,
+        query,
+        mode=total_mode,
+        cache_key=(search.strip() if search else None, search_mode, is_used)
+    )
+
+    page_query = query.order_by(AccessCode.created_at, AccessCode.id)
+    if cursor:
+        try:
+            page_query = after_cursor(page_query, cursor)
+        except ValueError:
+            raise HTTPException(
+                status_code=400,
+                detail="Некорректный курсор"
+            )
+    else:
+        page_query = page_query.offset(skip)
+
+    result = await db.execute(page_query.limit(limit))
     codes = result.scalars().all()
-    
-    total = await db.scalar(select(func.count()).select_from(query.subquery()))
+
+    next_cursor = None
+    if len(codes) == limit:
+        last = codes[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
     
     return {
         "items": codes,
         "total": total,
-        "skip": skip,
-        "limit": limit
+        "total_is_estimate": total_mode is TotalCountMode.ESTIMATED,
+        "skip": 0 if cursor else skip,
+        "limit": limit,
+        "next_cursor": next_cursor
     }
 
 @router.get("/{code}/usage", response_model=AccessCodeResponse)
 async def get_code_usage(
     code: str,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ) -> AccessCode:
     """
@@ -128,15 +265,58 @@ async def get_code_usage(
     
     return access_code
 
-@router.post("/{code}/use")
+async def limit_redemption(
+    code: str,
+    request: Request,
+    db: AsyncSession = Depends(get_db)
+) -> None:
+    """
+    Лимиты частоты активаций по IP и по коду. Выполняется до любых
+    обращений к хранилищу, чтобы перебор кодов не нагружал Postgres.
+
+    Лимит по коду защищает ещё не активированный код от подбора смены/отряда.
+    Для уже активированного кода он не действует: иначе любой, кто знает код,
+    мог бы лишить владельца повторной выдачи ссылок. Статус кода при
+    исчерпанном лимите берётся из кеша is_code_used, а не из базы на каждый запрос.
+    """
+    code = code.strip()
+    ip = client_ip(request)
+    try:
+        # Без адреса (unix-сокет, тестовый клиент) отдельной корзины нет:
+        # общая корзина «unknown» блокировала бы всех таких клиентов разом
+        if ip is not None:
+            await rate_limiter.check((f"use:ip:{ip}", REDEMPTION_IP_LIMIT))
+        try:
+            await rate_limiter.check((f"use:code:{code}", REDEMPTION_CODE_LIMIT))
+        except RateLimitExceeded:
+            if not await is_code_used(db, code):
+                raise
+    except RateLimitExceeded as e:
+        REDEMPTIONS.inc(outcome="rate_limited")
+        logger.warning("Redemption rate limit exceeded: %s", e.key)
+        raise HTTPException(
+            status_code=429,
+            detail="Слишком много попыток. Попробуйте позже.",
+            headers={"Retry-After": e.retry_after_header}
+        )
+
+@router.post(
+    "/{code}/use",
+    response_model=DownloadLinks,
+    responses={200: {"content": {"text/html": {}}}},
+    dependencies=[Depends(limit_redemption)]
+)
 async def use_code(
     code: str,
     form_data: FormData,
+    request: Request,
     db: AsyncSession = Depends(get_db)
-) -> dict:
+) -> DownloadLinks | HTMLResponse:
     """
     Использует код доступа и возвращает временные ссылки на архивы с фотографиями.
     Проверяет соответствие кода смене и отряду.
+    По умолчанию отдаёт страницу, которая сама начинает скачивание;
+    с Accept: application/json — только ссылки.
     """
     if form_data.promocode.strip() != code:
         raise HTTPException(
@@ -150,150 +330,164 @@ async def use_code(
             detail="Необходимо подтвердить согласие с правилами сервиса"
         )
 
-    existing_code = await db.scalar(
-        select(AccessCode).where(
-            and_(
-                AccessCode.code == code,
-                AccessCode.shift_number == form_data.shift,
-                AccessCode.squad_number == form_data.group
-            )
-        )
-    )
-    if not existing_code:
+    # Опечатки и перебор отсекаются фильтром выданных кодов без запроса к базе
+    if not await valid_codes.might_exist(code):
+        REDEMPTIONS.inc(outcome="filtered")
         raise HTTPException(
             status_code=404,
             detail="Код не найден или не соответствует указанной смене/отряду"
         )
-    if existing_code.is_used:
-        raise HTTPException(
-            status_code=400,
-            detail="Этот код уже был использован"
-        )
 
+    # Пока скачивание выключено, код не трогаем: FOR UPDATE и UPDATE с откатом
+    # дали бы только блокировки и мёртвые строки
     if not settings.DOWNLOADS_ENABLED:
+        REDEMPTIONS.inc(outcome="downloads_disabled")
         raise HTTPException(
             status_code=503,
             detail="Скачивание временно недоступно: медиафайлы еще загружаются. Попробуйте позже."
         )
 
-    # Генерируем временные ссылки до списания кода:
-    # если архивы недоступны, код не будет помечен использованным.
+    used_at = datetime.now(timezone.utc)
+    fingerprint = _form_fingerprint(form_data)
+    usage_data = {
+        **form_data.model_dump(),
+        # Для повтора ответа, если клиент не получил его и отправил форму снова
+        "request_fingerprint": fingerprint,
+        "download_expires_at": (
+            used_at + timedelta(seconds=settings.DOWNLOAD_URL_EXPIRES_SECONDS)
+        ).isoformat()
+    }
+
+    # Один запрос: находим код, проверяем смену/отряд и атомарно списываем его.
+    # Транзакция не фиксируется до генерации ссылок.
+    claim = await claim_access_code(
+        db,
+        code=code,
+        shift_number=form_data.shift,
+        squad_number=form_data.group,
+        values={
+            "is_used": True,
+            "used_at": used_at,
+            "full_name": f"{form_data.name} {form_data.surname}",
+            "used_by": client_ip(request),
+            "usage_data": usage_data
+        }
+    )
+    if claim.status in (RedemptionStatus.NOT_FOUND, RedemptionStatus.WRONG_SHIFT):
+        await db.rollback()
+        REDEMPTIONS.inc(outcome=claim.status.value)
+        raise HTTPException(
+            status_code=404,
+            detail="Код не найден или не соответствует указанной смене/отряду"
+        )
+    if claim.status == RedemptionStatus.ALREADY_USED:
+        await db.rollback()
+        remember_code_used(code)
+        expires_in = _replay_expires_in(claim.usage_data, fingerprint)
+        if expires_in is None:
+            REDEMPTIONS.inc(outcome="already_used")
+            raise HTTPException(
+                status_code=400,
+                detail="Этот код уже был использован"
+            )
+        # Повтор той же формы в пределах срока жизни ссылок: подписываем ссылки
+        # заново локально, с тем же сроком окончания, без обращений к S3
+        try:
+            download_urls = await archive_service.sign_download_urls(
+                shift_number=form_data.shift,
+                squad_number=form_data.group,
+                expires_in=expires_in
+            )
+        except Exception:
+            REDEMPTIONS.inc(outcome="s3_failure")
+            logger.exception("Error re-signing download URLs")
+            raise HTTPException(
+                status_code=500,
+                detail="Не удалось подготовить архивы для скачивания. Попробуйте позже."
+            )
+        REDEMPTIONS.inc(outcome="replayed")
+        return _download_response(request, download_urls, expires_in)
+
+    # Генерируем временные ссылки до фиксации списания:
+    # если архивы недоступны, транзакция откатывается и код остаётся свободным.
     try:
         download_urls = await archive_service.generate_download_urls(
             shift_number=form_data.shift,
             squad_number=form_data.group
         )
+    except ArchiveNotFoundError as e:
+        await db.rollback()
+        REDEMPTIONS.inc(outcome="archive_missing")
+        missing = ", ".join(_ARCHIVE_TITLES[check.kind] for check in e.missing)
+        raise HTTPException(
+            status_code=503,
+            detail=f"Архивы еще не готовы ({missing}). Попробуйте позже."
+        )
     except Exception:
+        await db.rollback()
+        REDEMPTIONS.inc(outcome="s3_failure")
         logger.exception("Error generating download URLs")
         raise HTTPException(
             status_code=500,
             detail="Не удалось подготовить архивы для скачивания. Попробуйте позже."
         )
 
-    usage_data = form_data.model_dump()
-    used_at = datetime.now(timezone.utc)
-
-    # Атомарное списание промокода (защита от гонок).
-    result = await db.execute(
-        update(AccessCode)
-        .where(
-            and_(
-                AccessCode.code == code,
-                AccessCode.shift_number == form_data.shift,
-                AccessCode.squad_number == form_data.group,
-                AccessCode.is_used.is_(False)
-            )
-        )
-        .values(
-            is_used=True,
-            used_at=used_at,
-            full_name=f"{form_data.name} {form_data.surname}",
-            usage_data=usage_data
-        )
-        .returning(AccessCode)
-    )
-    access_code = result.scalar_one_or_none()
-
-    if not access_code:
-        raise HTTPException(
-            status_code=400,
-            detail="Этот код уже был использован"
-        )
-
     try:
         await db.commit()
-        
-        # Создаем HTML страницу для автоматического скачивания
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>Скачивание архивов</title>
-            <meta charset="utf-8">
-            <style>
-                body {{
-                    font-family: Arial, sans-serif;
-                    text-align: center;
-                    padding: 20px;
-                }}
-                .message {{
-                    margin: 20px 0;
-                    padding: 10px;
-                    border-radius: 5px;
-                }}
-                .success {{
-                    background-color: #d4edda;
-                    color: #155724;
-                }}
-                .error {{
-                    background-color: #f8d7da;
-                    color: #721c24;
-                }}
-            </style>
-        </head>
-        <body>
-            <h1>Скачивание архивов</h1>
-            <div class="message success">
-                Начинаем скачивание архивов...
-            </div>
-            <script>
-                // Функция для скачивания файла
-                function downloadFile(url, filename) {{
-                    const link = document.createElement('a');
-                    link.href = url;
-                    link.download = filename;
-                    document.body.appendChild(link);
-                    link.click();
-                    document.body.removeChild(link);
-                }}
-
-                // Скачиваем оба архива
-                window.onload = function() {{
-                    downloadFile('{download_urls["squad_archive"]}', 'archive_squad.zip');
-                    setTimeout(() => {{
-                        downloadFile('{download_urls["total_archive"]}', 'archive_total.zip');
-                    }}, 1000);
-                }};
-            </script>
-        </body>
-        </html>
-        """
-        
-        return HTMLResponse(content=html_content)
     except Exception:
         await db.rollback()
+        REDEMPTIONS.inc(outcome="commit_failure")
         logger.exception("Error while finalizing code usage")
         raise HTTPException(
             status_code=500,
             detail="Не удалось завершить активацию промокода. Попробуйте позже."
         )
 
+    invalidate_shift_stats(form_data.shift)
+    remember_code_used(code)
+    REDEMPTIONS.inc(outcome="success")
+    return _download_response(request, download_urls, settings.DOWNLOAD_URL_EXPIRES_SECONDS)
+
+def _form_fingerprint(form_data: FormData) -> str:
+    """Отпечаток формы активации: повтор той же формы даёт тот же отпечаток."""
+    normalized = [
+        form_data.name.strip().casefold(),
+        form_data.surname.strip().casefold(),
+        form_data.shift,
+        form_data.group,
+        form_data.promocode.strip()
+    ]
+    return hashlib.sha256(json.dumps(normalized).encode()).hexdigest()
+
+def _replay_expires_in(usage_data: Optional[dict], fingerprint: str) -> Optional[int]:
+    """
+    Сколько секунд ещё действуют ссылки прошлой активации, если её можно повторить:
+    форма совпадает и срок не истёк. Иначе None.
+    """
+    if not usage_data or usage_data.get("request_fingerprint") != fingerprint:
+        return None
+    try:
+        expires_at = datetime.fromisoformat(usage_data["download_expires_at"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    expires_in = int((expires_at - datetime.now(timezone.utc)).total_seconds())
+    return expires_in if expires_in > 0 else None
+
+def _download_response(
+    request: Request,
+    download_urls: Dict[str, str],
+    expires_in: int
+) -> DownloadLinks | HTMLResponse:
+    if prefers_json(request.headers.get("accept", "")):
+        return DownloadLinks(**download_urls, expires_in=expires_in)
+    return HTMLResponse(content=render_download_page(download_urls))
+
 @router.get("/shift/{shift_number}", response_model=ShiftPromocodesResponse)
 async def get_shift_promocodes(
     shift_number: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
-) -> ShiftPromocodesResponse:
+) -> Response:
     """
     Получает все промокоды для указанной смены, сгруппированные по отрядам.
     Только для администраторов.
@@ -304,39 +498,32 @@ async def get_shift_promocodes(
             detail="Только администраторы могут просматривать промокоды"
         )
     
-    # Получаем все промокоды для указанной смены
-    result = await db.execute(
-        select(AccessCode)
-        .where(AccessCode.shift_number == shift_number)
-        .order_by(AccessCode.squad_number)
-    )
-    codes = result.scalars().all()
-    
-    # Группируем промокоды по отрядам
-    squads_dict = {}
-    for code in codes:
-        if code.squad_number not in squads_dict:
-            squads_dict[code.squad_number] = []
-        squads_dict[code.squad_number].append(code)
-    
-    # Формируем ответ
-    squads = [
-        SquadPromocodes(
-            squad_number=squad_number,
-            promocodes=codes
+    # Группировка и сериализация выполняются в базе, ответ отдаётся как есть
+    content = await get_shift_promocodes_json(db, shift_number)
+    return Response(content=content, media_type="application/json")
+
+@router.get("/shift/{shift_number}/stats", response_model=ShiftStatsResponse)
+async def get_shift_promocodes_stats(
+    shift_number: int,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+) -> ShiftStatsResponse:
+    """
+    Сколько кодов смены выдано и активировано по каждому отряду
+    и когда была последняя активация. Только для администраторов.
+    """
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=403,
+            detail="Только администраторы могут просматривать промокоды"
         )
-        for squad_number, codes in sorted(squads_dict.items())
-    ]
-    
-    return ShiftPromocodesResponse(
-        shift_number=shift_number,
-        squads=squads
-    )
+
+    return await get_shift_stats(db, shift_number)
 
 @router.get("/shift/{shift_number}/print", response_class=PlainTextResponse)
 async def get_shift_promocodes_print(
     shift_number: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ) -> str:
     """
@@ -349,38 +536,45 @@ async def get_shift_promocodes_print(
             detail="Только администраторы могут просматривать промокоды"
         )
     
-    # Получаем все неактивированные промокоды для указанной смены
-    result = await db.execute(
-        select(AccessCode)
-        .where(
-            and_(
-                AccessCode.shift_number == shift_number,
-                not_(AccessCode.is_used)
-            )
-        )
-        .order_by(AccessCode.squad_number)
-    )
-    codes = result.scalars().all()
-    
-    # Группируем промокоды по отрядам
-    squads_dict: dict[int, list[AccessCode]] = {}
-    for code in codes:
-        if code.squad_number not in squads_dict:
-            squads_dict[code.squad_number] = []
-        squads_dict[code.squad_number].append(code)
+    # Коды уже сгруппированы по отрядам в базе
+    squads = await get_unused_codes_by_squad(db, shift_number)
     
     # Формируем текстовый ответ
     output = []
     output.append(f"Смена {shift_number} - Неактивированные промокоды\n")
     output.append("=" * 50 + "\n")
     
-    for squad_number in sorted(squads_dict.keys()):
+    for squad_number, squad_codes in squads:
         output.append(f"\nОтряд {squad_number}")
         output.append("-" * 30)
-        
-        for code in squads_dict[squad_number]:
-            output.append(f"{code.code}")
-        
+        output.append(squad_codes)
         output.append("")  # Пустая строка между отрядами
     
     return "\n".join(output)
+
+@router.get("/shift/{shift_number}/export")
+async def export_shift_promocodes(
+    shift_number: int,
+    format: ExportFormat = ExportFormat.CSV,
+    only_unused: bool = False,
+    current_user: Principal = Depends(get_current_user)
+) -> StreamingResponse:
+    """
+    Выгружает промокоды смены потоком (CSV, NDJSON или текст для печати),
+    отсортированными по отрядам. Память не зависит от размера смены.
+    Только для администраторов.
+    """
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=403,
+            detail="Только администраторы могут просматривать промокоды"
+        )
+
+    extension = "txt" if format is ExportFormat.PRINT else format.value
+    return StreamingResponse(
+        export_shift_codes(shift_number, format, only_unused),
+        media_type=MEDIA_TYPES[format],
+        headers={
+            "Content-Disposition": f'attachment; filename="shift_{shift_number}_codes.{extension}"'
+        }
+    )
@@ -0,0 +1,237 @@
+import asyncio
+import hashlib
+import logging
+import math
+import time
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator, Optional
+from sqlalchemy import func, select
+from app.core.config import settings
+from app.core.metrics import GaugeCallback, registry
+from app.core.rate_limit import InMemoryRateLimitBackend, RateLimit
+from app.database import async_session
+from codes.models import AccessCode
+
+logger = logging.getLogger(__name__)
+
+# Сколько кодов читать из серверного курсора за раз при полной сборке
+BUILD_BATCH_SIZE = 2000
+# Перекрытие окна догрузки: created_at — время начала транзакции, поэтому коды
+# из долгой транзакции могут стать видны позже более новых
+REFRESH_OVERLAP = timedelta(minutes=1)
+
+
+class BloomFilter:
+    """
+    Фильтр Блума по строкам: «точно нет» или «возможно есть».
+    Размер и число хеш-функций подбираются по ожидаемому числу элементов
+    и допустимой доле ложных срабатываний.
+    """
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.num_bits = max(8, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, item: str) -> Iterator[int]:
+        # Двойное хеширование (Kirsch–Mitzenmacher): k позиций из одного дайджеста
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, item: str) -> bool:
+        """Добавляет элемент. :return: True, если элемента в фильтре ещё не было"""
+        added = False
+        for position in self._positions(item):
+            byte, mask = position >> 3, 1 << (position & 7)
+            if not self._bits[byte] & mask:
+                self._bits[byte] |= mask
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+    def update(self, items: Iterable[str]) -> None:
+        for item in items:
+            self.add(item)
+
+    def __contains__(self, item: str) -> bool:
+        # Для отсутствующих кодов обычно хватает одной-двух позиций
+        bits = self._bits
+        for position in self._positions(item):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self._bits)
+
+
+class ValidCodeFilter:
+    """
+    Фильтр Блума всех выданных кодов для быстрого отказа на опечатках и переборе
+    без запроса к базе. Собирается в фоне при старте приложения, затем
+    периодически догружает новые коды по created_at (коды других воркеров)
+    и раз в CODE_FILTER_REBUILD_SECONDS собирается заново.
+    Пока фильтр не собран, все коды считаются возможными.
+
+    Догрузка по created_at не видит коды из транзакций, зафиксированных позже
+    REFRESH_OVERLAP. Такие коды до пересборки находит проверка в базе при
+    промахе, ограниченная CODE_FILTER_MISS_LOOKUPS_PER_SECOND.
+    """
+
+    def __init__(self) -> None:
+        self._filter: Optional[BloomFilter] = None
+        self._watermark: Optional[datetime] = None
+        self._built_at = 0.0
+        self._last_refresh = 0.0
+        self._lookups = InMemoryRateLimitBackend(maxsize=1)
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if settings.CODE_FILTER_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if self.needs_rebuild():
+                    await self.rebuild()
+                else:
+                    await self.refresh()
+            except Exception:
+                logger.exception("Code filter refresh failed")
+            await asyncio.sleep(settings.CODE_FILTER_REFRESH_SECONDS)
+
+    def needs_rebuild(self) -> bool:
+        bloom = self._filter
+        return (
+            bloom is None
+            or bloom.count > bloom.capacity
+            or time.monotonic() - self._built_at >= settings.CODE_FILTER_REBUILD_SECONDS
+        )
+
+    async def rebuild(self) -> None:
+        """Собирает фильтр заново по всем кодам (при старте, при переполнении и по расписанию)."""
+        started = time.perf_counter()
+        current = self._filter.count if self._filter is not None else 0
+        bloom = BloomFilter(
+            max(settings.CODE_FILTER_CAPACITY, current * 2),
+            settings.CODE_FILTER_ERROR_RATE
+        )
+        async with async_session() as session:
+            # Коды, созданные во время сборки, догрузит refresh с этой отметки
+            watermark = await session.scalar(select(func.now()))
+            result = await session.stream(
+                select(AccessCode.code).execution_options(yield_per=BUILD_BATCH_SIZE)
+            )
+            async for partition in result.partitions():
+                for (code,) in partition:
+                    bloom.add(code)
+                await asyncio.sleep(0)  # не занимаем event loop на всю сборку
+        async with self._lock:
+            self._filter = bloom
+            self._watermark = watermark
+            self._built_at = time.monotonic()
+            self._last_refresh = 0.0
+        logger.info(
+            "Code filter built: %s codes, %s KiB, %.1fs",
+            bloom.count,
+            bloom.size_bytes // 1024,
+            time.perf_counter() - started
+        )
+        await self.refresh()
+
+    async def refresh(self, max_age: float = 0.0) -> None:
+        """
+        Догружает коды, созданные после последней отметки.
+        :param max_age: Не обновлять, если последнее обновление было не раньше стольких секунд назад
+        """
+        async with self._lock:
+            if self._filter is None or self._watermark is None:
+                return
+            if max_age and time.monotonic() - self._last_refresh < max_age:
+                return
+            async with async_session() as session:
+                result = await session.execute(
+                    select(AccessCode.code, AccessCode.created_at)
+                    .where(AccessCode.created_at >= self._watermark - REFRESH_OVERLAP)
+                    .order_by(AccessCode.created_at)
+                )
+                for code, created_at in result:
+                    self._filter.add(code)
+                    if created_at > self._watermark:
+                        self._watermark = created_at
+            self._last_refresh = time.monotonic()
+
+    def add_many(self, codes: Iterable[str]) -> None:
+        """Добавляет только что созданные коды этого процесса."""
+        if self._filter is not None:
+            self._filter.update(codes)
+
+    async def _lookup(self, code: str) -> bool:
+        """Проверяет промах фильтра в базе, если перебор ещё не исчерпал лимит проверок."""
+        per_second = settings.CODE_FILTER_MISS_LOOKUPS_PER_SECOND
+        if per_second <= 0:
+            return False
+        limit = RateLimit(capacity=max(1.0, per_second), refill_per_second=per_second)
+        if not (await self._lookups.consume("lookup", limit)).allowed:
+            return False
+        async with async_session() as session:
+            found = await session.scalar(
+                select(AccessCode.code).where(AccessCode.code == code)
+            )
+        if found is None:
+            return False
+        logger.warning("Code %s missed by the filter refresh, added after lookup", code)
+        self.add_many([code])
+        return True
+
+    async def might_exist(self, code: str) -> bool:
+        """
+        False — кода точно нет в базе. Перед отказом фильтр один раз догружается
+        (не чаще CODE_FILTER_MISS_REFRESH_SECONDS), чтобы не отклонить код,
+        только что созданный другим воркером. Если кода нет и после догрузки,
+        он проверяется в базе, пока не исчерпан CODE_FILTER_MISS_LOOKUPS_PER_SECOND;
+        сверх этого лимита решает фильтр.
+        """
+        if self._filter is None or code in self._filter:
+            return True
+        try:
+            await self.refresh(max_age=settings.CODE_FILTER_MISS_REFRESH_SECONDS)
+            return code in self._filter or await self._lookup(code)
+        except Exception:
+            logger.exception("Code filter check failed")
+            return True
+
+    def stats(self) -> dict[tuple[str, ...], float]:
+        bloom = self._filter
+        if bloom is None:
+            return {}
+        return {("codes",): bloom.count, ("bytes",): bloom.size_bytes}
+
+
+valid_codes = ValidCodeFilter()
+
+registry.register(GaugeCallback(
+    "code_filter_size",
+    "Valid code Bloom filter size (codes and bytes)",
+    valid_codes.stats,
+    labels=("unit",),
+))
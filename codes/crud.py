@@ -0,0 +1,375 @@
+import base64
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Optional
+from sqlalchemy import (
+    select,
+    update,
+    and_,
+    or_,
+    not_,
+    case,
+    func,
+    text,
+    tuple_,
+    cast,
+    literal,
+    literal_column,
+    ColumnElement,
+    DateTime,
+    Select,
+    Text
+)
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.cache import TTLCache
+from app.core.config import settings
+from codes.enums import RedemptionStatus, SearchMode, TotalCountMode
+from codes.models import AccessCode
+from codes.schemas import ShiftStatsResponse, SquadStats
+
+
+@dataclass(frozen=True)
+class RedemptionClaim:
+    status: RedemptionStatus
+    access_code_id: Optional[int] = None
+    # Данные прошлой активации (для ALREADY_USED) — чтобы повторить ответ
+    usage_data: Optional[dict[str, Any]] = None
+
+
+async def claim_access_code(
+    db: AsyncSession,
+    code: str,
+    shift_number: int,
+    squad_number: int,
+    values: dict[str, Any]
+) -> RedemptionClaim:
+    """
+    Списывает промокод одним запросом к базе.
+
+    CTE `target` блокирует строку с кодом (FOR UPDATE), CTE `claimed` помечает
+    её использованной, только если смена/отряд совпадают и код ещё свободен.
+    По итоговой строке различаем: код не найден, не та смена/отряд, уже использован.
+    Для уже использованного кода возвращаются сохранённые usage_data.
+    Изменение не фиксируется — коммит остаётся за вызывающим кодом.
+    """
+    target = (
+        select(
+            AccessCode.id,
+            AccessCode.shift_number,
+            AccessCode.squad_number,
+            AccessCode.is_used,
+            AccessCode.usage_data
+        )
+        .where(AccessCode.code == code)
+        .with_for_update()
+        .cte("target")
+    )
+    claimed = (
+        update(AccessCode)
+        .where(
+            and_(
+                AccessCode.id == target.c.id,
+                target.c.shift_number == shift_number,
+                target.c.squad_number == squad_number,
+                target.c.is_used.is_(False)
+            )
+        )
+        .values(**values)
+        .returning(AccessCode.id)
+        .cte("claimed")
+    )
+    result = await db.execute(
+        select(
+            target.c.id,
+            target.c.shift_number,
+            target.c.squad_number,
+            target.c.is_used,
+            target.c.usage_data,
+            claimed.c.id.is_not(None).label("claimed")
+        )
+        .select_from(target)
+        .outerjoin(claimed, claimed.c.id == target.c.id)
+    )
+    row = result.one_or_none()
+
+    if row is None:
+        return RedemptionClaim(status=RedemptionStatus.NOT_FOUND)
+    if row.claimed:
+        return RedemptionClaim(status=RedemptionStatus.CLAIMED, access_code_id=row.id)
+    if row.shift_number != shift_number or row.squad_number != squad_number:
+        return RedemptionClaim(status=RedemptionStatus.WRONG_SHIFT, access_code_id=row.id)
+    return RedemptionClaim(
+        status=RedemptionStatus.ALREADY_USED,
+        access_code_id=row.id,
+        usage_data=row.usage_data
+    )
+
+
+# Активированный код обратно не освобождается, поэтому «использован» хранится
+# долго. «Не использован» — только RATE_LIMIT_CODE_STATUS_TTL_SECONDS: код могли
+# активировать на другом воркере, и повтор не должен долго упираться в лимит.
+_code_used_cache: TTLCache[str, bool] = TTLCache(ttl=3600, maxsize=10_000)
+
+
+async def is_code_used(db: AsyncSession, code: str) -> bool:
+    """
+    Активирован ли код (False, если кода нет). Ответ кешируется: проверка
+    нужна на каждый отклонённый лимитом запрос, а база должна видеть их не чаще
+    раза в RATE_LIMIT_CODE_STATUS_TTL_SECONDS на код.
+    """
+    cached = _code_used_cache.get(code)
+    if cached is not None:
+        return cached
+    used = bool(await db.scalar(select(AccessCode.is_used).where(AccessCode.code == code)))
+    _code_used_cache.set(
+        code, used, ttl=None if used else settings.RATE_LIMIT_CODE_STATUS_TTL_SECONDS
+    )
+    return used
+
+
+def remember_code_used(code: str) -> None:
+    """Отмечает код как активированный без запроса к базе."""
+    _code_used_cache.set(code, True)
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def code_search_filter(search: str, mode: SearchMode = SearchMode.SUBSTRING) -> ColumnElement[bool]:
+    """
+    Условие поиска по коду и ФИО для списка кодов в админке.
+
+    SUBSTRING ищет подстроку (ILIKE). С pg_trgm запросы от трёх символов идут
+    по GIN-индексам, иначе — полным просмотром таблицы: медленно, но результат тот же.
+    PREFIX ищет по началу строки через lower(...) и btree-индексы на любой базе.
+    """
+    term = _escape_like(search.strip())
+    if mode is SearchMode.PREFIX:
+        prefix = f"{term.lower()}%"
+        return or_(
+            func.lower(AccessCode.code).like(prefix, escape="\\"),
+            func.lower(AccessCode.full_name).like(prefix, escape="\\")
+        )
+
+    pattern = f"%{term}%"
+    return or_(
+        AccessCode.code.ilike(pattern, escape="\\"),
+        AccessCode.full_name.ilike(pattern, escape="\\")
+    )
+
+
+def encode_cursor(created_at: datetime, code_id: int) -> str:
+    """Непрозрачный курсор на позицию (created_at, id) в списке кодов."""
+    raw = json.dumps([created_at.isoformat(), code_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """:raises ValueError: если курсор повреждён"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, code_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), int(code_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError("Некорректный курсор") from e
+
+
+def after_cursor(query: Select, cursor: str) -> Select:
+    created_at, code_id = decode_cursor(cursor)
+    return query.where(
+        tuple_(AccessCode.created_at, AccessCode.id) > tuple_(literal(created_at), literal(code_id))
+    )
+
+
+_count_cache: TTLCache[tuple[Any, ...], int] = TTLCache(
+    ttl=settings.CODE_COUNT_CACHE_TTL_SECONDS, maxsize=256
+)
+
+
+async def count_codes(
+    db: AsyncSession,
+    filtered: Select,
+    mode: TotalCountMode,
+    cache_key: tuple[Any, ...]
+) -> Optional[int]:
+    """
+    Считает количество кодов, подходящих под фильтры списка.
+
+    EXACT — точный COUNT; ESTIMATED — статистика планировщика (pg_class.reltuples)
+    для списка без фильтров или недавно посчитанное значение из кэша; NONE — не считаем.
+    """
+    if mode is TotalCountMode.NONE:
+        return None
+
+    if mode is TotalCountMode.ESTIMATED:
+        if filtered.whereclause is None:
+            estimate = await db.scalar(text(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = 'access_code'::regclass"
+            ))
+            # reltuples = -1, пока таблица ни разу не анализировалась
+            if estimate is not None and estimate >= 0:
+                return int(estimate)
+        cached = _count_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    total = await db.scalar(
+        select(func.count()).select_from(filtered.order_by(None).subquery())
+    ) or 0
+    _count_cache.set(cache_key, total)
+    return total
+
+
+_shift_stats_cache: TTLCache[int, ShiftStatsResponse] = TTLCache(
+    ttl=settings.SHIFT_STATS_CACHE_TTL_SECONDS, maxsize=256
+)
+
+
+async def get_shift_stats(db: AsyncSession, shift_number: int) -> ShiftStatsResponse:
+    """
+    Статистика активаций смены по отрядам одним GROUP BY.
+    Результат кэшируется на SHIFT_STATS_CACHE_TTL_SECONDS и сбрасывается
+    при активации кода и генерации новых кодов смены.
+    """
+    cached = _shift_stats_cache.get(shift_number)
+    if cached is not None:
+        return cached
+
+    result = await db.execute(
+        select(
+            AccessCode.squad_number,
+            func.count(),
+            func.count().filter(AccessCode.is_used),
+            func.max(AccessCode.used_at)
+        )
+        .where(AccessCode.shift_number == shift_number)
+        .group_by(AccessCode.squad_number)
+        .order_by(AccessCode.squad_number)
+    )
+    squads = [
+        SquadStats(
+            squad_number=squad_number,
+            total=total,
+            used=used,
+            unused=total - used,
+            last_used_at=last_used_at
+        )
+        for squad_number, total, used, last_used_at in result
+    ]
+    used_times = [squad.last_used_at for squad in squads if squad.last_used_at is not None]
+    stats = ShiftStatsResponse(
+        shift_number=shift_number,
+        total=sum(squad.total for squad in squads),
+        used=sum(squad.used for squad in squads),
+        unused=sum(squad.unused for squad in squads),
+        last_used_at=max(used_times, default=None),
+        squads=squads
+    )
+    _shift_stats_cache.set(shift_number, stats)
+    return stats
+
+
+def invalidate_shift_stats(shift_number: int) -> None:
+    _shift_stats_cache.pop(shift_number)
+
+
+# Поля AccessCodeResponse, которые собираются в JSON прямо в базе
+_PROMOCODE_JSON_FIELDS = (
+    "id",
+    "code",
+    "is_used",
+    "created_at",
+    "used_at",
+    "used_by",
+    "usage_data",
+    "full_name",
+    "squad_number",
+    "shift_number",
+    "created_by_id",
+)
+
+
+def _json_timestamp(column: ColumnElement[Any]) -> ColumnElement[Any]:
+    """
+    Время в UTC в том же виде, что отдаёт Pydantic: 2026-07-01T12:00:00Z,
+    с микросекундами только если они есть. Сам json_build_object записал бы +00:00.
+    """
+    utc = func.timezone("UTC", column)
+    return case(
+        (func.date_trunc("second", column) == column,
+         func.to_char(utc, 'YYYY-MM-DD"T"HH24:MI:SS"Z"')),
+        else_=func.to_char(utc, 'YYYY-MM-DD"T"HH24:MI:SS.US"Z"')
+    )
+
+
+def shift_promocodes_query(shift_number: int) -> Select:
+    """Запрос для get_shift_promocodes_json: по строке JSON-массива кодов на отряд."""
+    columns = AccessCode.__table__.c
+    promocode = func.json_build_object(
+        *(
+            part
+            for field in _PROMOCODE_JSON_FIELDS
+            for part in (
+                literal_column(f"'{field}'"),
+                _json_timestamp(columns[field])
+                if isinstance(columns[field].type, DateTime) else columns[field]
+            )
+        )
+    )
+    return (
+        select(
+            AccessCode.squad_number,
+            cast(func.json_agg(aggregate_order_by(promocode, AccessCode.id)), Text)
+        )
+        .where(AccessCode.shift_number == shift_number)
+        .group_by(AccessCode.squad_number)
+        .order_by(AccessCode.squad_number)
+    )
+
+
+async def get_shift_promocodes_json(db: AsyncSession, shift_number: int) -> str:
+    """
+    Возвращает готовый JSON ShiftPromocodesResponse для смены.
+    Группировка по отрядам и сериализация выполняются в Postgres (json_agg),
+    без загрузки ORM-объектов и повторной валидации Pydantic. Формат полей
+    совпадает с тем, что вернула бы модель ответа.
+    """
+    result = await db.execute(shift_promocodes_query(shift_number))
+    squads = ",".join(
+        f'{{"squad_number":{squad_number},"promocodes":{promocodes}}}'
+        for squad_number, promocodes in result
+    )
+    return f'{{"shift_number":{shift_number},"squads":[{squads}]}}'
+
+
+def unused_codes_by_squad_query(shift_number: int) -> Select:
+    """Запрос для get_unused_codes_by_squad."""
+    return (
+        select(
+            AccessCode.squad_number,
+            func.string_agg(
+                AccessCode.code,
+                aggregate_order_by(literal_column("E'\\n'"), AccessCode.id)
+            )
+        )
+        .where(
+            and_(
+                AccessCode.shift_number == shift_number,
+                not_(AccessCode.is_used)
+            )
+        )
+        .group_by(AccessCode.squad_number)
+        .order_by(AccessCode.squad_number)
+    )
+
+
+async def get_unused_codes_by_squad(db: AsyncSession, shift_number: int) -> list[tuple[int, str]]:
+    """
+    Неактивированные коды смены, сгруппированные по отрядам в базе.
+    :return: Пары (номер отряда, коды через перевод строки)
+    """
+    result = await db.execute(unused_codes_by_squad_query(shift_number))
+    return [(squad_number, codes) for squad_number, codes in result]
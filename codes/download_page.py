@@ -0,0 +1,98 @@
+import json
+from string import Template
+from typing import Dict
+
+# Страница автоматического скачивания архивов после активации кода.
+# Шаблон разбирается один раз при импорте; при каждом запросе подставляется
+# только JSON со ссылками.
+_DOWNLOAD_PAGE = Template("""<!DOCTYPE html>
+<html>
+<head>
+    <title>Скачивание архивов</title>
+    <meta charset="utf-8">
+    <style>
+        body {
+            font-family: Arial, sans-serif;
+            text-align: center;
+            padding: 20px;
+        }
+        .message {
+            margin: 20px 0;
+            padding: 10px;
+            border-radius: 5px;
+        }
+        .success {
+            background-color: #d4edda;
+            color: #155724;
+        }
+        .error {
+            background-color: #f8d7da;
+            color: #721c24;
+        }
+    </style>
+</head>
+<body>
+    <h1>Скачивание архивов</h1>
+    <div class="message success">
+        Начинаем скачивание архивов...
+    </div>
+    <script>
+        const urls = $urls;
+
+        // Функция для скачивания файла
+        function downloadFile(url, filename) {
+            const link = document.createElement('a');
+            link.href = url;
+            link.download = filename;
+            document.body.appendChild(link);
+            link.click();
+            document.body.removeChild(link);
+        }
+
+        // Скачиваем оба архива
+        window.onload = function() {
+            downloadFile(urls.squad_archive, 'archive_squad.zip');
+            setTimeout(() => {
+                downloadFile(urls.total_archive, 'archive_total.zip');
+            }, 1000);
+        };
+    </script>
+</body>
+</html>
+""")
+
+# Внутри <script> HTML-экранирование не работает, поэтому JSON дополнительно
+# экранируется так, чтобы в нём не могло встретиться </script> или <!--
+_SCRIPT_ESCAPES = str.maketrans({
+    "<": "\\u003c",
+    ">": "\\u003e",
+    "&": "\\u0026",
+})
+
+
+def render_download_page(download_urls: Dict[str, str]) -> str:
+    """HTML-страница, которая сразу начинает скачивание обоих архивов."""
+    urls = json.dumps(download_urls).translate(_SCRIPT_ESCAPES)
+    return _DOWNLOAD_PAGE.substitute(urls=urls)
+
+
+def prefers_json(accept: str) -> bool:
+    """
+    Согласование формата ответа по заголовку Accept:
+    JSON отдаётся, только если application/json весит больше, чем text/html.
+    """
+    weights = {"application/json": 0.0, "text/html": 0.0}
+    for part in accept.split(","):
+        media_type, *params = [item.strip() for item in part.split(";")]
+        if media_type not in weights:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        weights[media_type] = max(weights[media_type], quality)
+    return weights["application/json"] > weights["text/html"]
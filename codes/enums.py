@@ -0,0 +1,37 @@
+from enum import Enum
+
+
+class RedemptionStatus(str, Enum):
+    """Результат попытки списать промокод."""
+    CLAIMED = "claimed"
+    NOT_FOUND = "not_found"
+    WRONG_SHIFT = "wrong_shift"
+    ALREADY_USED = "already_used"
+
+
+class TotalCountMode(str, Enum):
+    """Как считать общее количество записей в списке кодов."""
+    EXACT = "exact"
+    ESTIMATED = "estimated"
+    NONE = "none"
+
+
+class SearchMode(str, Enum):
+    """Как искать по коду и ФИО в списке кодов."""
+    SUBSTRING = "substring"
+    PREFIX = "prefix"
+
+
+class ExportFormat(str, Enum):
+    """Формат выгрузки промокодов смены."""
+    CSV = "csv"
+    NDJSON = "ndjson"
+    PRINT = "print"
+
+
+class JobStatus(str, Enum):
+    """Состояние фоновой задачи генерации кодов."""
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
@@ -0,0 +1,109 @@
+import csv
+import io
+import json
+from typing import Any, AsyncIterator, Iterable, Sequence
+from sqlalchemy import Row, select, and_, not_
+from sqlalchemy.orm import InstrumentedAttribute
+from app.database import async_session
+from codes.enums import ExportFormat
+from codes.models import AccessCode
+
+# Сколько строк читать из серверного курсора за раз
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_COLUMNS: tuple[InstrumentedAttribute[Any], ...] = (
+    AccessCode.id,
+    AccessCode.code,
+    AccessCode.shift_number,
+    AccessCode.squad_number,
+    AccessCode.is_used,
+    AccessCode.created_at,
+    AccessCode.used_at,
+    AccessCode.used_by,
+    AccessCode.full_name,
+)
+EXPORT_FIELDS = [column.key for column in EXPORT_COLUMNS]
+
+MEDIA_TYPES = {
+    ExportFormat.CSV: "text/csv; charset=utf-8",
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.PRINT: "text/plain; charset=utf-8",
+}
+
+
+async def _stream_rows(shift_number: int, only_unused: bool) -> AsyncIterator[Sequence[Row]]:
+    """
+    Читает коды смены пачками через серверный курсор.
+    Сессия открывается здесь, а не через Depends: генератор работает
+    уже после выхода из обработчика, пока ответ отправляется клиенту.
+    """
+    conditions = [AccessCode.shift_number == shift_number]
+    if only_unused:
+        conditions.append(not_(AccessCode.is_used))
+
+    async with async_session() as session:
+        result = await session.stream(
+            select(*EXPORT_COLUMNS)
+            .where(and_(*conditions))
+            .order_by(AccessCode.squad_number, AccessCode.id)
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        async for partition in result.partitions():
+            yield partition
+
+
+def _csv_chunk(rows: Iterable[Row], header: bool = False) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        writer.writerow(
+            value.isoformat() if hasattr(value, "isoformat") else value
+            for value in row
+        )
+    return buffer.getvalue().encode()
+
+
+def _ndjson_chunk(rows: Iterable[Row]) -> bytes:
+    return "".join(
+        json.dumps(row._asdict(), ensure_ascii=False, default=str) + "\n"
+        for row in rows
+    ).encode()
+
+
+async def export_shift_codes(
+    shift_number: int,
+    export_format: ExportFormat,
+    only_unused: bool
+) -> AsyncIterator[bytes]:
+    """Отдаёт промокоды смены по частям в выбранном формате."""
+    if export_format is ExportFormat.CSV:
+        yield _csv_chunk((), header=True)
+        async for rows in _stream_rows(shift_number, only_unused):
+            yield _csv_chunk(rows)
+        return
+
+    if export_format is ExportFormat.NDJSON:
+        async for rows in _stream_rows(shift_number, only_unused):
+            yield _ndjson_chunk(rows)
+        return
+
+    # Текст для печати в том же виде, что и /codes/shift/{n}/print:
+    # строки разделены переводом строки, между отрядами пустая строка
+    title = "Неактивированные промокоды" if only_unused else "Промокоды"
+    yield f"Смена {shift_number} - {title}\n\n{'=' * 50}\n".encode()
+    current_squad = None
+    async for rows in _stream_rows(shift_number, only_unused):
+        lines = []
+        for row in rows:
+            if row.squad_number != current_squad:
+                if current_squad is not None:
+                    lines.append("")
+                current_squad = row.squad_number
+                lines.append(f"\nОтряд {current_squad}")
+                lines.append("-" * 30)
+            lines.append(row.code)
+        yield "".join(f"\n{line}" for line in lines).encode()
+    if current_squad is not None:
+        yield b"\n"
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Optional
+from app.database import async_session
+from codes.enums import JobStatus
+from codes.services import CodeSpaceExhaustedError, code_generator
+from users.schemas import Principal
+
+logger = logging.getLogger(__name__)
+
+# Сколько кодов генерировать и сохранять за одну транзакцию
+JOB_CHUNK_SIZE = 5000
+
+
+@dataclass
+class GenerationJob:
+    id: str
+    shift_number: int
+    plan: dict[int, int]  # номер отряда -> количество кодов
+    created_by_id: int
+    status: JobStatus = JobStatus.PENDING
+    generated: int = 0
+    collisions: int = 0
+    current_squad: Optional[int] = None
+    error: Optional[str] = None
+    created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    finished_at: Optional[datetime] = None
+
+    @property
+    def total(self) -> int:
+        return sum(self.plan.values())
+
+
+class GenerationJobManager:
+    """
+    Фоновая генерация кодов для целой смены.
+
+    Задачи и их прогресс хранятся в памяти процесса: статус доступен
+    в том же экземпляре приложения, который принял задачу.
+    Коды сохраняются пачками по JOB_CHUNK_SIZE, каждая пачка — отдельная транзакция,
+    поэтому при ошибке уже сохранённые коды остаются и видны в `generated`.
+    """
+
+    def __init__(self, max_finished_jobs: int = 100) -> None:
+        self.max_finished_jobs = max_finished_jobs
+        self._jobs: "OrderedDict[str, GenerationJob]" = OrderedDict()
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    def submit(self, shift_number: int, plan: dict[int, int], user: Principal) -> GenerationJob:
+        job = GenerationJob(
+            id=uuid.uuid4().hex,
+            shift_number=shift_number,
+            plan=dict(sorted(plan.items())),
+            created_by_id=user.id
+        )
+        self._jobs[job.id] = job
+        self._forget_finished()
+        task = asyncio.create_task(self._run(job, user))
+        self._tasks[job.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.id, None))
+        return job
+
+    def get(self, job_id: str) -> Optional[GenerationJob]:
+        return self._jobs.get(job_id)
+
+    def list_jobs(self) -> list[GenerationJob]:
+        return list(reversed(self._jobs.values()))
+
+    async def shutdown(self) -> None:
+        """Отменяет незавершённые задачи при остановке приложения."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self, job: GenerationJob, user: Principal) -> None:
+        job.status = JobStatus.RUNNING
+        try:
+            for squad_number, count in job.plan.items():
+                job.current_squad = squad_number
+                remaining = count
+                while remaining > 0:
+                    chunk = min(remaining, JOB_CHUNK_SIZE)
+                    async with async_session() as db:
+                        result = await code_generator.generate_codes(
+                            count=chunk,
+                            user=user,
+                            db=db,
+                            squad_number=squad_number,
+                            shift_number=job.shift_number
+                        )
+                    job.generated += len(result.codes)
+                    job.collisions += result.collisions
+                    remaining -= chunk
+            job.status = JobStatus.COMPLETED
+            job.current_squad = None
+        except asyncio.CancelledError:
+            job.status = JobStatus.FAILED
+            job.error = "Задача прервана остановкой сервера"
+            raise
+        except CodeSpaceExhaustedError as e:
+            logger.warning("Code generation job %s stopped: %s", job.id, e)
+            job.status = JobStatus.FAILED
+            job.error = f"Отряд {job.current_squad}: {e}"
+        except Exception as e:
+            logger.exception("Code generation job %s failed", job.id)
+            job.status = JobStatus.FAILED
+            job.error = str(e)
+        finally:
+            job.finished_at = datetime.now(timezone.utc)
+            logger.info(
+                "Code generation job %s for shift=%s finished: status=%s generated=%s/%s",
+                job.id,
+                job.shift_number,
+                job.status.value,
+                job.generated,
+                job.total
+            )
+
+    def _forget_finished(self) -> None:
+        finished = [
+            job_id for job_id, job in self._jobs.items()
+            if job.status in (JobStatus.COMPLETED, JobStatus.FAILED)
+        ]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job_id]
+
+
+generation_jobs = GenerationJobManager()
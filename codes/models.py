@@ -1,19 +1,37 @@
-from sqlalchemy import Boolean, String, DateTime, JSON, ForeignKey, Integer
+from sqlalchemy import Boolean, String, DateTime, JSON, ForeignKey, Integer, Index, text
+from sqlalchemy import Connection, Table
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from sqlalchemy.sql import func
+from sqlalchemy.sql.ddl import BaseDDLElement
+from sqlalchemy.sql.schema import SchemaItem
 from app.database import Base
-from typing import TYPE_CHECKING, Optional
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Optional
 
 if TYPE_CHECKING:
     from users.models import User
 
 class AccessCode(Base):
     __tablename__ = "access_code"
+    __table_args__ = (
+        # Выборки по смене/отряду: use_code, списки промокодов смены
+        Index("ix_access_code_shift_squad", "shift_number", "squad_number"),
+        # Печать неактивированных кодов: частичный индекс, код читается прямо из индекса
+        Index(
+            "ix_access_code_unused_shift_squad",
+            "shift_number",
+            "squad_number",
+            postgresql_where=text("NOT is_used"),
+            postgresql_include=["code"],
+        ),
+        # Курсорная пагинация списка кодов
+        Index("ix_access_code_created_at_id", "created_at", "id"),
+    )
 
     code: Mapped[str] = mapped_column(String, unique=True, index=True)
     is_used: Mapped[bool] = mapped_column(Boolean, default=False)
-    created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now())
-    used_at: Mapped[Optional[DateTime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    used_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
     used_by: Mapped[Optional[str]] = mapped_column(String, nullable=True)  # IP address or user identifier
     usage_data: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)  # Additional usage information
     created_by_id: Mapped[int] = mapped_column(ForeignKey("user.id"))
@@ -24,3 +42,48 @@ class AccessCode(Base):
     shift_number: Mapped[int] = mapped_column(Integer)
 
     created_by: Mapped["User"] = relationship(back_populates="access_codes")
+
+
+def _has_pg_trgm(
+    ddl: BaseDDLElement,
+    target: SchemaItem,
+    bind: Optional[Connection],
+    tables: Optional[list[Table]] = None,
+    state: Optional[Any] = None,
+    **kw: Any
+) -> bool:
+    # Без соединения (генерация SQL без базы) наличие расширения не проверить
+    if bind is None:
+        return False
+    return bool(bind.exec_driver_sql(
+        "SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')"
+    ).scalar())
+
+
+# Поиск в админке: префиксный поиск по btree и подстрочный по триграммам (pg_trgm)
+Index(
+    "ix_access_code_code_lower_prefix",
+    func.lower(AccessCode.code).label("code_lower"),
+    postgresql_ops={"code_lower": "text_pattern_ops"},
+)
+Index(
+    "ix_access_code_full_name_lower_prefix",
+    func.lower(AccessCode.full_name).label("full_name_lower"),
+    postgresql_ops={"full_name_lower": "text_pattern_ops"},
+)
+# Как и в миграции 8e4b6d0c3f19, триграммные индексы создаются только там,
+# где установлен pg_trgm; без них поиск подстроки работает, но медленнее
+Index(
+    "ix_access_code_code_trgm",
+    AccessCode.code,
+    postgresql_using="gin",
+    postgresql_ops={"code": "gin_trgm_ops"},
+    info={"requires_extension": "pg_trgm"},
+).ddl_if(dialect="postgresql", callable_=_has_pg_trgm)
+Index(
+    "ix_access_code_full_name_trgm",
+    AccessCode.full_name,
+    postgresql_using="gin",
+    postgresql_ops={"full_name": "gin_trgm_ops"},
+    info={"requires_extension": "pg_trgm"},
+).ddl_if(dialect="postgresql", callable_=_has_pg_trgm)
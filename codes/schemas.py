@@ -1,6 +1,7 @@
 from typing import Optional, Dict, List
 from datetime import datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, field_validator
+from codes.enums import JobStatus
 
 
 class AccessCodeBase(BaseModel):
@@ -38,9 +39,11 @@ class AccessCodeResponse(AccessCodeInDB):
 
 class AccessCodeList(BaseModel):
     items: list[AccessCodeResponse]
-    total: int
+    total: Optional[int] = None
+    total_is_estimate: bool = False
     skip: int
     limit: int
+    next_cursor: Optional[str] = None
 
 class AccessCodeUsage(BaseModel):
     full_name: str
@@ -55,6 +58,11 @@ class FormData(BaseModel):
     promocode: str
     agree: bool
 
+class DownloadLinks(BaseModel):
+    squad_archive: str
+    total_archive: str
+    expires_in: int  # секунд
+
 class SquadPromocodes(BaseModel):
     squad_number: int
     promocodes: List[AccessCodeResponse]
@@ -62,3 +70,48 @@ class SquadPromocodes(BaseModel):
 class ShiftPromocodesResponse(BaseModel):
     shift_number: int
     squads: List[SquadPromocodes]
+
+class SquadStats(BaseModel):
+    squad_number: int
+    total: int
+    used: int
+    unused: int
+    last_used_at: Optional[datetime] = None
+
+class ShiftStatsResponse(BaseModel):
+    shift_number: int
+    total: int
+    used: int
+    unused: int
+    last_used_at: Optional[datetime] = None
+    squads: List[SquadStats]
+
+class GenerationJobCreate(BaseModel):
+    shift_number: int = Field(..., gt=0)
+    squads: Dict[int, int]  # номер отряда -> количество кодов
+
+    @field_validator("squads")
+    @classmethod
+    def validate_squads(cls, v: Dict[int, int]) -> Dict[int, int]:
+        if not v:
+            raise ValueError("Нужно указать хотя бы один отряд")
+        for squad_number, count in v.items():
+            if squad_number <= 0 or count <= 0:
+                raise ValueError("Номер отряда и количество кодов должны быть положительными")
+        return v
+
+class GenerationJobResponse(BaseModel):
+    id: str
+    shift_number: int
+    plan: Dict[int, int]
+    status: JobStatus
+    total: int
+    generated: int
+    collisions: int
+    current_squad: Optional[int] = None
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
@@ -1,10 +1,17 @@
+import logging
 import secrets
 import string
+from dataclasses import dataclass, field
 from typing import List
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, insert
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from codes.bloom import valid_codes
+from codes.crud import invalidate_shift_stats
 from codes.models import AccessCode
-from users.models import User
+from users.schemas import Principal
+
+logger = logging.getLogger(__name__)
 
 # Без символов, которые легко перепутать: 0/O/o, 1/I/i/L/l
 _AMBIGUOUS = set("0Oo1IiLl")
@@ -12,56 +19,148 @@ _SAFE_ALPHABET = "".join(
     c for c in string.ascii_letters + string.digits if c not in _AMBIGUOUS
 )
 
+# Строк в одном INSERT (5 параметров на строку, лимит asyncpg — 32767 параметров)
+INSERT_BATCH_SIZE = 5000
+
+
+class CodeSpaceExhaustedError(Exception):
+    """Unique codes could not be generated within max_rounds (code space is nearly full)"""
+
+
+@dataclass
+class CodeGenerationResult:
+    """Created codes and collision statistics of one generation run"""
+    requested: int
+    codes: List[AccessCode] = field(default_factory=list)
+    rounds: int = 0
+    collisions: int = 0  # rejected by the unique index on access_code.code
+    duplicates: int = 0  # repeated within a generated batch
+
 
 class CodeGenerator:
-    def __init__(self, length: int = 8):
+    def __init__(self, length: int = 8, max_rounds: int = 10):
         self.length = length
         self.alphabet = _SAFE_ALPHABET
+        self.max_rounds = max_rounds
+
+        # Таблица для bytes.translate: случайный байт -> символ алфавита.
+        # Байты от наибольшего кратного длины алфавита и выше отбрасываются,
+        # иначе первые символы алфавита выпадали бы чаще (смещение по модулю).
+        size = len(self.alphabet)
+        self._accept_limit = 256 - 256 % size
+        self._byte_table = bytes(ord(self.alphabet[i % size]) for i in range(256))
+        self._rejected_bytes = bytes(range(self._accept_limit, 256))
 
     def generate_code(self) -> str:
         """Generate a single unique code"""
         return ''.join(secrets.choice(self.alphabet) for _ in range(self.length))
 
+    def generate_codes_batch(self, count: int) -> List[str]:
+        """
+        Generate `count` codes from one CSPRNG buffer.
+
+        Random bytes come from secrets.token_bytes and are mapped onto the
+        alphabet with bytes.translate (rejection sampling, no modulo bias),
+        so the per-character work happens in C instead of Python.
+        """
+        needed = count * self.length
+        chars = bytearray()
+        while len(chars) < needed:
+            # Часть байтов отбрасывается, поэтому берём с запасом
+            missing = needed - len(chars)
+            raw = secrets.token_bytes(missing * 256 // self._accept_limit + 16)
+            chars += raw.translate(self._byte_table, self._rejected_bytes)
+
+        text = chars[:needed].decode("ascii")
+        return [text[i:i + self.length] for i in range(0, needed, self.length)]
+
+    async def generate_codes(
+        self,
+        count: int,
+        user: Principal,
+        db: AsyncSession,
+        squad_number: int,
+        shift_number: int
+    ) -> CodeGenerationResult:
+        """
+        Generate `count` unique codes and save them to database.
+
+        Codes are inserted with ON CONFLICT DO NOTHING, so a collision with an
+        existing code only drops that code; the missing ones are regenerated
+        and inserted in the next round until `count` is reached.
+        """
+        stats = CodeGenerationResult(requested=count)
+        statement = (
+            pg_insert(AccessCode)
+            .on_conflict_do_nothing(index_elements=[AccessCode.code])
+            .returning(AccessCode)
+            .execution_options(insertmanyvalues_page_size=INSERT_BATCH_SIZE)
+        )
+
+        while len(stats.codes) < count:
+            if stats.rounds >= self.max_rounds:
+                await db.rollback()
+                raise CodeSpaceExhaustedError(
+                    f"Не удалось сгенерировать {count} уникальных кодов за {stats.rounds} попыток: "
+                    f"{stats.collisions} совпадений с уже выданными кодами"
+                )
+            stats.rounds += 1
+
+            # Дубликаты внутри пачки отсекаем сразу, с базой разбирается ON CONFLICT
+            needed = count - len(stats.codes)
+            codes: set[str] = set()
+            while len(codes) < needed:
+                batch = self.generate_codes_batch(needed - len(codes))
+                before = len(codes)
+                codes.update(batch)
+                stats.duplicates += len(batch) - (len(codes) - before)
+
+            codes_data = [
+                {
+                    "code": code,
+                    "created_by_id": user.id,
+                    "squad_number": squad_number,
+                    "shift_number": shift_number
+                }
+                for code in codes
+            ]
+            result = await db.execute(statement, codes_data)
+            inserted = list(result.scalars().all())
+            stats.collisions += len(codes) - len(inserted)
+            stats.codes.extend(inserted)
+
+        await db.commit()
+        invalidate_shift_stats(shift_number)
+        valid_codes.add_many(code.code for code in stats.codes)
+
+        logger.info(
+            "Generated %s codes for shift=%s squad=%s: rounds=%s collisions=%s duplicates=%s",
+            count,
+            shift_number,
+            squad_number,
+            stats.rounds,
+            stats.collisions,
+            stats.duplicates
+        )
+        return stats
+
     async def generate_multiple_codes(
         self, 
         count: int, 
-        user: User, 
+        user: Principal, 
         db: AsyncSession,
         squad_number: int,
         shift_number: int
     ) -> List[AccessCode]:
         """Generate multiple unique codes and save them to database"""
-        # Генерируем коды с запасом на случай дубликатов
-        codes: set[str] = set()
-        max_attempts = count * 2  # Увеличиваем количество попыток для учета возможных дубликатов
-        
-        while len(codes) < count and len(codes) < max_attempts:
-            codes.add(self.generate_code())
-        
-        if len(codes) < count:
-            raise ValueError(f"Не удалось сгенерировать {count} уникальных кодов после {max_attempts} попыток")
-        
-        # Подготавливаем данные для bulk insert
-        codes_data = [
-            {
-                "code": code, 
-                "created_by_id": user.id,
-                "squad_number": squad_number,
-                "shift_number": shift_number
-            }
-            for code in codes
-        ]
-        
-        # Выполняем bulk insert
-        result = await db.execute(
-            insert(AccessCode).returning(AccessCode),
-            codes_data
+        result = await self.generate_codes(
+            count=count,
+            user=user,
+            db=db,
+            squad_number=squad_number,
+            shift_number=shift_number
         )
-        await db.commit()
-        
-        # Получаем созданные коды
-        db_codes = list(result.scalars().all())
-        return db_codes
+        return result.codes
 
     async def is_code_unique(self, code: str, db: AsyncSession) -> bool:
         """Check if a code is unique in the database"""
@@ -1,8 +1,16 @@
+from typing import Any, AsyncGenerator, Literal
 from fastapi import APIRouter, Depends, HTTPException
-from app.core.config import settings
-from media.archive_service import archive_service
-from users.models import User
+from fastapi.responses import StreamingResponse
+from media.archive_service import (
+    archive_service,
+    ArchiveNotFoundError,
+    ArchiveServiceError,
+    InvalidArchiveTokenError
+)
+from media.zip_stream import SourceObject
+from users.schemas import Principal
 from users.services import get_current_user
+import json
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,10 +20,17 @@ router = APIRouter(prefix="/media", tags=["media"])
 @router.get("/check-total/{shift_number}")
 async def check_total_folder(
     shift_number: int,
-    current_user: User = Depends(get_current_user)
+    format: Literal["json", "ndjson"] = "json",
+    include_files: bool = True,
+    fan_out: bool = False,
+    current_user: Principal = Depends(get_current_user)
 ):
     """
-    Проверяет содержимое папки total для указанной смены
+    Проверяет содержимое папки total для указанной смены.
+    Список обходится постранично (без ограничения в 1000 ключей).
+    format=ndjson отдаёт файлы потоком по строке, последней строкой идёт итог;
+    include_files=false возвращает только количество и общий размер;
+    fan_out=true листает подпапки параллельно.
     """
     if not current_user.is_admin:
         raise HTTPException(
@@ -23,28 +38,114 @@ async def check_total_folder(
             detail="Только администраторы могут выполнять эту операцию"
         )
 
-    total_prefix = f"{shift_number}/total/"
+    total_prefix = archive_service.source_prefix(shift_number)
+
+    if format == "ndjson":
+        return StreamingResponse(
+            _stream_total_folder(shift_number, total_prefix, include_files, fan_out),
+            media_type="application/x-ndjson"
+        )
+
+    files = []
+    total_files = 0
+    total_size = 0
     async with archive_service.get_client() as client:
         try:
-            total_objects = await client.list_objects(
-                Bucket=settings.AWS_BUCKET_NAME,
-                Prefix=total_prefix
-            )
-            files = []
-            for obj in total_objects.get('Contents', []):
-                files.append({
-                    'key': obj['Key'],
-                    'size': obj['Size'],
-                    'last_modified': obj['LastModified'].isoformat()
-                })
-            return {
-                'shift_number': shift_number,
-                'total_files': len(files),
-                'files': files
-            }
+            async for obj in archive_service.walk_objects(client, total_prefix, fan_out=fan_out):
+                total_files += 1
+                total_size += obj.size
+                if include_files:
+                    files.append(_file_info(obj))
         except Exception:
             logger.exception("Error checking total folder")
             raise HTTPException(
                 status_code=500,
                 detail="Не удалось проверить папку total"
             )
+    result: dict[str, Any] = {
+        'shift_number': shift_number,
+        'total_files': total_files,
+        'total_size': total_size
+    }
+    if include_files:
+        result['files'] = files
+    return result
+
+def _file_info(obj: SourceObject) -> dict:
+    return {
+        'key': obj.key,
+        'size': obj.size,
+        'last_modified': obj.last_modified.isoformat() if obj.last_modified else None
+    }
+
+async def _stream_total_folder(
+    shift_number: int,
+    prefix: str,
+    include_files: bool,
+    fan_out: bool
+) -> AsyncGenerator[str, None]:
+    total_files = 0
+    total_size = 0
+    summary: dict = {'shift_number': shift_number}
+    async with archive_service.get_client() as client:
+        try:
+            async for obj in archive_service.walk_objects(client, prefix, fan_out=fan_out):
+                total_files += 1
+                total_size += obj.size
+                if include_files:
+                    yield json.dumps(_file_info(obj)) + "\n"
+        except Exception:
+            # Статус ответа уже отправлен: сообщаем об ошибке итоговой строкой
+            logger.exception("Error checking total folder")
+            summary['error'] = "Не удалось проверить папку total"
+    summary.update(total_files=total_files, total_size=total_size)
+    yield json.dumps({'summary': summary}, ensure_ascii=False) + "\n"
+
+@router.post("/archives/{shift_number}/invalidate")
+async def invalidate_archives(
+    shift_number: int,
+    squad_number: int | None = None,
+    current_user: Principal = Depends(get_current_user)
+) -> dict:
+    """
+    Сбрасывает кэш наличия архивов смены (или одного отряда) после перезаливки
+    """
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=403,
+            detail="Только администраторы могут выполнять эту операцию"
+        )
+
+    archive_service.invalidate_archives(shift_number, squad_number)
+    return {
+        'shift_number': shift_number,
+        'squad_number': squad_number,
+        'invalidated': True
+    }
+
+@router.get("/archives/download")
+async def download_archive(token: str) -> StreamingResponse:
+    """
+    Отдаёт ZIP-архив, собираемый на лету из фотографий (ARCHIVE_MODE=stream).
+    Доступ по подписанной ссылке, которую выдаёт активация кода.
+    """
+    try:
+        shift_number, squad_number = archive_service.decode_stream_token(token)
+    except InvalidArchiveTokenError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+
+    try:
+        archive = await archive_service.stream_archive(shift_number, squad_number)
+    except ArchiveNotFoundError:
+        raise HTTPException(status_code=404, detail="Фотографии для архива не найдены")
+    except ArchiveServiceError:
+        raise HTTPException(status_code=500, detail="Не удалось подготовить архив")
+
+    return StreamingResponse(
+        archive.content,
+        media_type="application/zip",
+        headers={
+            "Content-Length": str(archive.size),
+            "Content-Disposition": f'attachment; filename="{archive.filename}"'
+        }
+    )
@@ -0,0 +1,218 @@
+import asyncio
+import hashlib
+import logging
+import time
+from dataclasses import dataclass
+from typing import AsyncGenerator, Literal, Optional, Sequence
+from aiobotocore.client import AioBaseClient  # type: ignore
+from botocore.exceptions import ClientError  # type: ignore
+from app.core.config import settings
+from media.archive_service import archive_service, ArchiveServiceError
+from media.zip_stream import SourceObject, stream_zip
+
+logger = logging.getLogger(__name__)
+
+# S3 требует части не меньше 5 МиБ (кроме последней)
+MIN_PART_SIZE = 5 * 1024 * 1024
+PART_SIZE = 16 * 1024 * 1024
+UPLOAD_CONCURRENCY = 4
+FINGERPRINT_METADATA_KEY = "source-fingerprint"
+
+BuildStatus = Literal["built", "skipped", "empty"]
+
+
+@dataclass(frozen=True)
+class BuildResult:
+    key: str
+    status: BuildStatus
+    files: int = 0
+    size: int = 0
+    parts: int = 0
+    seconds: float = 0.0
+
+
+def source_fingerprint(objects: Sequence[SourceObject]) -> str:
+    """Отпечаток набора фотографий: меняется при добавлении, удалении или перезаливке файла."""
+    digest = hashlib.sha256()
+    for obj in sorted(objects, key=lambda item: item.key):
+        digest.update(f"{obj.key}\0{obj.etag}\0{obj.size}\n".encode())
+    return digest.hexdigest()
+
+
+class ArchiveBuilder:
+    """
+    Собирает готовые архивы shifts/{shift}_{squad}.zip и shifts/{shift}_total.zip
+    из фотографий и загружает их multipart upload'ом.
+    Отпечаток исходных файлов хранится в метаданных архива: если фотографии
+    не менялись, архив не пересобирается. Любое изменение (даже одна новая
+    фотография) пересобирает и загружает архив целиком: смещения всех записей
+    после изменённой сдвигаются, а части multipart upload режутся по размеру,
+    поэтому готовые части прошлого архива повторно не используются.
+    """
+
+    def __init__(
+        self,
+        client: AioBaseClient,
+        part_size: int = PART_SIZE,
+        upload_concurrency: int = UPLOAD_CONCURRENCY
+    ) -> None:
+        if part_size < MIN_PART_SIZE:
+            raise ValueError(f"part_size должен быть не меньше {MIN_PART_SIZE} байт")
+        self.client = client
+        self.part_size = part_size
+        self.upload_concurrency = max(1, upload_concurrency)
+
+    async def discover_squads(self, shift_number: int) -> list[int]:
+        """Номера отрядов, для которых в хранилище есть папка {shift}/{squad}/."""
+        squads = []
+        paginator = self.client.get_paginator('list_objects_v2')
+        async for page in paginator.paginate(
+            Bucket=settings.AWS_BUCKET_NAME,
+            Prefix=f"{shift_number}/",
+            Delimiter="/"
+        ):
+            for item in page.get('CommonPrefixes', []):
+                name = item['Prefix'].rstrip('/').rsplit('/', 1)[-1]
+                if name.isdigit():
+                    squads.append(int(name))
+        return sorted(squads)
+
+    async def build(
+        self,
+        shift_number: int,
+        squad_number: Optional[int],
+        force: bool = False
+    ) -> BuildResult:
+        """
+        Собирает архив отряда (или общий архив смены при squad_number=None).
+        :param force: Пересобрать, даже если фотографии не менялись
+        """
+        if squad_number is None:
+            key = archive_service.total_archive_key(shift_number)
+        else:
+            key = archive_service.squad_archive_key(shift_number, squad_number)
+        prefix = archive_service.source_prefix(shift_number, squad_number)
+
+        sources = [obj async for obj in archive_service.list_objects(self.client, prefix)]
+        if not sources:
+            return BuildResult(key=key, status="empty")
+
+        fingerprint = source_fingerprint(sources)
+        if not force and await self._current_fingerprint(key) == fingerprint:
+            return BuildResult(key=key, status="skipped", files=len(sources))
+
+        started = time.perf_counter()
+        content = stream_zip(
+            self.client,
+            settings.AWS_BUCKET_NAME,
+            sources,
+            prefix,
+            chunk_size=settings.ARCHIVE_STREAM_CHUNK_SIZE,
+            concurrency=settings.ARCHIVE_STREAM_CONCURRENCY,
+            compress=True
+        )
+        size, parts = await self._upload(
+            key,
+            content,
+            metadata={
+                FINGERPRINT_METADATA_KEY: fingerprint,
+                "source-count": str(len(sources))
+            }
+        )
+        return BuildResult(
+            key=key,
+            status="built",
+            files=len(sources),
+            size=size,
+            parts=parts,
+            seconds=time.perf_counter() - started
+        )
+
+    async def _current_fingerprint(self, key: str) -> Optional[str]:
+        try:
+            head = await self.client.head_object(Bucket=settings.AWS_BUCKET_NAME, Key=key)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+        fingerprint: Optional[str] = head.get('Metadata', {}).get(FINGERPRINT_METADATA_KEY)
+        return fingerprint
+
+    async def _upload(
+        self,
+        key: str,
+        content: AsyncGenerator[bytes, None],
+        metadata: dict[str, str]
+    ) -> tuple[int, int]:
+        """
+        Загружает поток частями по part_size, до upload_concurrency частей параллельно.
+        Пока все слоты заняты, чтение архива приостанавливается, поэтому в памяти
+        не больше (upload_concurrency + 1) частей.
+        :return: Размер архива и число частей
+        """
+        upload = await self.client.create_multipart_upload(
+            Bucket=settings.AWS_BUCKET_NAME,
+            Key=key,
+            ContentType="application/zip",
+            Metadata=metadata
+        )
+        upload_id = upload['UploadId']
+        slots = asyncio.Semaphore(self.upload_concurrency)
+        tasks: list[asyncio.Task] = []
+
+        async def upload_part(number: int, body: bytes) -> dict:
+            try:
+                response = await self.client.upload_part(
+                    Bucket=settings.AWS_BUCKET_NAME,
+                    Key=key,
+                    UploadId=upload_id,
+                    PartNumber=number,
+                    Body=body
+                )
+                return {'PartNumber': number, 'ETag': response['ETag']}
+            finally:
+                slots.release()
+
+        async def submit(body: bytes) -> None:
+            await slots.acquire()
+            # Не читаем архив дальше, если какая-то часть уже не загрузилась
+            for task in tasks:
+                error = task.exception() if task.done() else None
+                if error is not None:
+                    slots.release()
+                    raise error
+            tasks.append(asyncio.ensure_future(upload_part(len(tasks) + 1, body)))
+
+        size = 0
+        buffer = bytearray()
+        try:
+            async for chunk in content:
+                buffer += chunk
+                size += len(chunk)
+                if len(buffer) >= self.part_size:
+                    await submit(bytes(buffer[:self.part_size]))
+                    del buffer[:self.part_size]
+            if buffer or not tasks:
+                await submit(bytes(buffer))
+            parts = await asyncio.gather(*tasks)
+            await self.client.complete_multipart_upload(
+                Bucket=settings.AWS_BUCKET_NAME,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={'Parts': parts}
+            )
+        except BaseException as e:
+            await content.aclose()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self.client.abort_multipart_upload(
+                Bucket=settings.AWS_BUCKET_NAME,
+                Key=key,
+                UploadId=upload_id
+            )
+            logger.exception("Archive upload failed, multipart upload %s aborted", upload_id)
+            if isinstance(e, Exception):
+                raise ArchiveServiceError(f"Не удалось собрать архив {key}") from e
+            raise
+        return size, len(tasks)
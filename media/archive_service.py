@@ -1,102 +1,542 @@
+import asyncio
 import logging
+import time
+from datetime import datetime, timedelta, timezone
 from app.core.config import settings
 from aiobotocore.session import get_session  # type: ignore
 from aiobotocore.client import AioBaseClient  # type: ignore
-from typing import AsyncGenerator, Literal, Dict
-from contextlib import asynccontextmanager
-from botocore.config import Config  # type: ignore
+from aiobotocore.config import AioConfig  # type: ignore
+from botocore.exceptions import ClientError  # type: ignore
+from typing import Any, AsyncContextManager, AsyncGenerator, AsyncIterator, Literal, Dict, Optional
+from contextlib import asynccontextmanager, AsyncExitStack
+from dataclasses import dataclass
+from jose import JWTError, jwt
+from app.core.cache import TTLCache
+from app.core.metrics import S3_OPERATION_DURATION
+from media.zip_stream import SourceObject, stream_zip, zip_size
 
 logger = logging.getLogger(__name__)
 
+# Сколько подпапок обходится одновременно при walk_objects(fan_out=True)
+LIST_FAN_OUT_CONCURRENCY = 8
+
+
+def s3_call_result(status_code: Optional[int]) -> str:
+    """Метка result для s3_operation_duration_seconds по HTTP-статусу ответа."""
+    if status_code is None:
+        return 'error'
+    if status_code < 300:
+        return 'ok'
+    if status_code == 404:
+        return 'not_found'
+    if 400 <= status_code < 500:
+        return 'client_error'
+    return 'error'
+
+
+@dataclass(frozen=True)
+class ArchiveInfo:
+    key: str
+    etag: str
+    size: int
+
+    @classmethod
+    def from_head(cls, key: str, head: dict) -> "ArchiveInfo":
+        return cls(
+            key=key,
+            etag=head.get('ETag', '').strip('"'),
+            size=head.get('ContentLength', 0)
+        )
+
+
+@dataclass(frozen=True)
+class ArchiveSet:
+    squad: ArchiveInfo
+    total: ArchiveInfo
+
+
+ArchiveKind = Literal["squad_archive", "total_archive"]
+
+
+@dataclass(frozen=True)
+class ArchiveCheck:
+    """Результат проверки одного архива в хранилище."""
+    kind: ArchiveKind
+    key: str
+    info: Optional[ArchiveInfo] = None
+
+    @property
+    def exists(self) -> bool:
+        return self.info is not None
+
+
+class ArchiveServiceError(Exception):
+    pass
+
+
+class ArchiveNotFoundError(ArchiveServiceError):
+    def __init__(self, missing: list[ArchiveCheck]) -> None:
+        self.missing = missing
+        keys = ", ".join(check.key for check in missing)
+        super().__init__(f"Архивы не найдены: {keys}")
+
+
+class InvalidArchiveTokenError(ArchiveServiceError):
+    pass
+
+
+@dataclass(frozen=True)
+class StreamedArchive:
+    """Архив, собираемый на лету из отдельных фотографий."""
+    filename: str
+    size: int
+    content: AsyncGenerator[bytes, None]
+
+
+ARCHIVE_TOKEN_SCOPE = "archive"
+
+
 class ArchiveService:
     def __init__(self) -> None:
         self.session = get_session()
+        self._client: Optional[AioBaseClient] = None
+        self._exit_stack: Optional[AsyncExitStack] = None
+        self._archive_cache: TTLCache[tuple[int, int], ArchiveSet] = TTLCache(
+            ttl=settings.ARCHIVE_CACHE_TTL_SECONDS
+        )
+        # Список фотографий по (смена, отряд); отряд None — общая папка смены
+        self._source_cache: TTLCache[tuple[int, Optional[int]], tuple[SourceObject, ...]] = TTLCache(
+            ttl=settings.ARCHIVE_CACHE_TTL_SECONDS
+        )
 
-    @asynccontextmanager
-    async def get_client(self) -> AsyncGenerator[AioBaseClient, None]:
-        config = Config(
+    def _build_config(self) -> AioConfig:
+        return AioConfig(
             s3={'addressing_style': 'path'},
-            signature_version='s3v4'
+            signature_version='s3v4',
+            max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+            connect_timeout=settings.S3_CONNECT_TIMEOUT,
+            read_timeout=settings.S3_READ_TIMEOUT,
+            tcp_keepalive=True,
+            connector_args={'keepalive_timeout': settings.S3_KEEPALIVE_TIMEOUT}
         )
-        
-        async with self.session.create_client(
+
+    def _create_client(self) -> AsyncContextManager[AioBaseClient]:
+        client: AsyncContextManager[AioBaseClient] = self.session.create_client(
             's3',
             endpoint_url=settings.AWS_ENDPOINT_URL,
             aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
             aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
             region_name=settings.AWS_REGION,
             verify=False,
-            config=config
-        ) as client:
-            yield client
+            config=self._build_config()
+        )
+        return client
+
+    async def start(self) -> None:
+        """
+        Открывает общий S3-клиент на всё время жизни приложения.
+        Вызывается из lifespan FastAPI.
+        """
+        if self._client is not None:
+            return
+        exit_stack = AsyncExitStack()
+        self._client = self._instrument(
+            await exit_stack.enter_async_context(self._create_client())
+        )
+        self._exit_stack = exit_stack
+        logger.info(
+            "S3 client started (max_pool_connections=%s)",
+            settings.S3_MAX_POOL_CONNECTIONS
+        )
+
+    async def close(self) -> None:
+        """Закрывает общий S3-клиент и его пул соединений."""
+        exit_stack, self._exit_stack = self._exit_stack, None
+        self._client = None
+        if exit_stack is not None:
+            await exit_stack.aclose()
+            logger.info("S3 client closed")
+
+    @asynccontextmanager
+    async def get_client(self) -> AsyncGenerator[AioBaseClient, None]:
+        # Внутри приложения используем общий клиент с прогретым пулом соединений.
+        # Вне lifespan (скрипты, консоль) открываем временный клиент.
+        if self._client is not None:
+            yield self._client
+            return
+
+        async with self._create_client() as client:
+            yield self._instrument(client)
+
+    @staticmethod
+    def _instrument(client: AioBaseClient) -> AioBaseClient:
+        """Замеряет длительность каждого вызова S3 API (метрика s3_operation_duration_seconds)."""
+        def before_call(model: Any, context: dict, **kwargs: Any) -> None:
+            context['metrics_operation'] = model.name
+            context['metrics_started'] = time.perf_counter()
+
+        def record(context: dict, result: str) -> None:
+            started = context.pop('metrics_started', None)
+            if started is not None:
+                S3_OPERATION_DURATION.observe(
+                    time.perf_counter() - started,
+                    operation=context.pop('metrics_operation'),
+                    result=result
+                )
+
+        def after_call(context: dict, http_response: Any = None, **kwargs: Any) -> None:
+            # after-call срабатывает и для ответов с ошибкой (404 на head_object и т.п.):
+            # ClientError поднимается уже после события, поэтому смотрим на статус
+            status = getattr(http_response, 'status_code', None)
+            record(context, s3_call_result(status))
+
+        events = client.meta.events
+        events.register('before-call.s3', before_call)
+        events.register('after-call.s3', after_call)
+        events.register(
+            'after-call-error.s3', lambda context, **kwargs: record(context, 'error')
+        )
+        return client
 
     async def generate_download_urls(self, shift_number: int, squad_number: int) -> Dict[str, str]:
         """
-        Генерирует временные ссылки для скачивания обоих архивов
+        Генерирует временные ссылки для скачивания обоих архивов.
+        Если наличие архивов недавно подтверждено, ссылки подписываются локально
+        без обращений к хранилищу; иначе архивы проверяются через head_object.
         :param shift_number: Номер смены
         :param squad_number: Номер отряда
         :return: Словарь с ссылками на архивы
+        :raises ArchiveNotFoundError: если какого-то из архивов нет в хранилище
         """
-        squad_archive_key = f"shifts/{shift_number}_{squad_number}.zip"
-        total_archive_key = f"shifts/{shift_number}_total.zip"
-        
+        if settings.ARCHIVE_MODE == "stream":
+            return await self._generate_stream_urls(shift_number, squad_number)
+
         async with self.get_client() as client:
+            archives = self._archive_cache.get((shift_number, squad_number))
+            if archives is None:
+                checks = await self.check_archives(client, shift_number, squad_number)
+                squad_info = checks["squad_archive"].info
+                total_info = checks["total_archive"].info
+                if squad_info is None or total_info is None:
+                    missing = [check for check in checks.values() if not check.exists]
+                    logger.warning(
+                        "Missing archives for shift=%s squad=%s: %s",
+                        shift_number,
+                        squad_number,
+                        ", ".join(check.key for check in missing)
+                    )
+                    raise ArchiveNotFoundError(missing)
+                archives = ArchiveSet(squad=squad_info, total=total_info)
+                self._archive_cache.set((shift_number, squad_number), archives)
+
             try:
-                # Проверяем существование файлов
-                await client.head_object(
-                    Bucket=settings.AWS_BUCKET_NAME,
-                    Key=squad_archive_key
-                )
-                await client.head_object(
-                    Bucket=settings.AWS_BUCKET_NAME,
-                    Key=total_archive_key
-                )
-                
-                # Генерируем временные ссылки
-                squad_url = await client.generate_presigned_url(
-                    'get_object',
-                    Params={
-                        'Bucket': settings.AWS_BUCKET_NAME,
-                        'Key': squad_archive_key
-                    },
-                    ExpiresIn=86400  # Ссылка действительна 24 часа
-                )
-                logger.info(
-                    "Generated squad archive URL for shift=%s squad=%s",
-                    shift_number,
-                    squad_number
-                )
-                
-                total_url = await client.generate_presigned_url(
-                    'get_object',
-                    Params={
-                        'Bucket': settings.AWS_BUCKET_NAME,
-                        'Key': total_archive_key
-                    },
-                    ExpiresIn=86400  # Ссылка действительна 24 часа
-                )
-                logger.info(
-                    "Generated total archive URL for shift=%s squad=%s",
-                    shift_number,
-                    squad_number
-                )
-                
-                result = {
-                    "squad_archive": squad_url,
-                    "total_archive": total_url
-                }
-                logger.info(
-                    "Returning signed archive URLs for shift=%s squad=%s",
-                    shift_number,
-                    squad_number
-                )
-                return result
+                # Генерируем временные ссылки (подпись считается локально)
+                squad_url = await self._presign(client, archives.squad.key)
+                total_url = await self._presign(client, archives.total.key)
             except Exception as e:
                 logger.exception(
                     "Error generating download URLs for shift=%s squad=%s",
                     shift_number,
                     squad_number
                 )
-                raise Exception("Архивы не найдены или произошла ошибка при генерации ссылок") from e
+                raise ArchiveServiceError("Произошла ошибка при генерации ссылок") from e
+
+            result = {
+                "squad_archive": squad_url,
+                "total_archive": total_url
+            }
+            logger.info(
+                "Returning signed archive URLs for shift=%s squad=%s",
+                shift_number,
+                squad_number
+            )
+            return result
+
+    async def check_archives(
+        self,
+        client: AioBaseClient,
+        shift_number: int,
+        squad_number: int
+    ) -> Dict[ArchiveKind, ArchiveCheck]:
+        """
+        Параллельно проверяет наличие архива отряда и общего архива смены.
+        :return: Результат проверки по каждому архиву
+        """
+        squad_check, total_check = await asyncio.gather(
+            self._head_archive(
+                client, "squad_archive", self.squad_archive_key(shift_number, squad_number)
+            ),
+            self._head_archive(
+                client, "total_archive", self.total_archive_key(shift_number)
+            )
+        )
+        return {"squad_archive": squad_check, "total_archive": total_check}
+
+    async def _head_archive(self, client: AioBaseClient, kind: ArchiveKind, key: str) -> ArchiveCheck:
+        try:
+            head = await client.head_object(
+                Bucket=settings.AWS_BUCKET_NAME,
+                Key=key
+            )
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return ArchiveCheck(kind=kind, key=key)
+            logger.exception("Error checking archive %s", key)
+            raise ArchiveServiceError(f"Не удалось проверить архив {key}") from e
+        return ArchiveCheck(kind=kind, key=key, info=ArchiveInfo.from_head(key, head))
+
+    async def _presign(self, client: AioBaseClient, key: str, expires_in: Optional[int] = None) -> str:
+        url: str = await client.generate_presigned_url(
+            'get_object',
+            Params={
+                'Bucket': settings.AWS_BUCKET_NAME,
+                'Key': key
+            },
+            ExpiresIn=settings.DOWNLOAD_URL_EXPIRES_SECONDS if expires_in is None else expires_in
+        )
+        return url
+
+    async def sign_download_urls(
+        self,
+        shift_number: int,
+        squad_number: int,
+        expires_in: int
+    ) -> Dict[str, str]:
+        """
+        Подписывает ссылки на архивы без проверки их наличия в хранилище.
+        Нужна для повтора уже выданного ответа: подпись считается локально,
+        запросов к S3 нет.
+        """
+        if settings.ARCHIVE_MODE == "stream":
+            return {
+                "squad_archive": self.stream_url(shift_number, squad_number, expires_in),
+                "total_archive": self.stream_url(shift_number, None, expires_in)
+            }
+        async with self.get_client() as client:
+            return {
+                "squad_archive": await self._presign(
+                    client, self.squad_archive_key(shift_number, squad_number), expires_in
+                ),
+                "total_archive": await self._presign(
+                    client, self.total_archive_key(shift_number), expires_in
+                )
+            }
+
+    async def list_objects(self, client: AioBaseClient, prefix: str) -> AsyncIterator[SourceObject]:
+        """Постранично обходит все объекты под префиксом (list_objects_v2)."""
+        paginator = client.get_paginator('list_objects_v2')
+        async for page in paginator.paginate(Bucket=settings.AWS_BUCKET_NAME, Prefix=prefix):
+            for item in page.get('Contents', []):
+                if not item['Key'].endswith('/'):
+                    yield SourceObject.from_listing(item)
+
+    async def walk_objects(
+        self,
+        client: AioBaseClient,
+        prefix: str,
+        fan_out: bool = False,
+        concurrency: int = LIST_FAN_OUT_CONCURRENCY
+    ) -> AsyncIterator[SourceObject]:
+        """
+        Обходит все объекты под префиксом.
+        С fan_out подпапки первого уровня листаются параллельно (до concurrency штук),
+        порядок объектов при этом не гарантируется. Между обходом и потребителем
+        ограниченная очередь, поэтому весь список в памяти не накапливается.
+        """
+        if not fan_out:
+            async for obj in self.list_objects(client, prefix):
+                yield obj
+            return
+
+        sub_prefixes: list[str] = []
+        paginator = client.get_paginator('list_objects_v2')
+        async for page in paginator.paginate(
+            Bucket=settings.AWS_BUCKET_NAME,
+            Prefix=prefix,
+            Delimiter='/'
+        ):
+            sub_prefixes.extend(item['Prefix'] for item in page.get('CommonPrefixes', []))
+            for item in page.get('Contents', []):
+                if not item['Key'].endswith('/'):
+                    yield SourceObject.from_listing(item)
+        if not sub_prefixes:
+            return
+
+        queue: asyncio.Queue[SourceObject | Exception | None] = asyncio.Queue(maxsize=1000)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def walk(sub_prefix: str) -> None:
+            try:
+                async with semaphore:
+                    async for obj in self.list_objects(client, sub_prefix):
+                        await queue.put(obj)
+            except Exception as e:
+                await queue.put(e)
+                return
+            await queue.put(None)
+
+        tasks = [asyncio.ensure_future(walk(sub_prefix)) for sub_prefix in sub_prefixes]
+        try:
+            remaining = len(tasks)
+            while remaining:
+                item = await queue.get()
+                if item is None:
+                    remaining -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _list_sources(
+        self,
+        client: AioBaseClient,
+        shift_number: int,
+        squad_number: Optional[int]
+    ) -> tuple[SourceObject, ...]:
+        key = (shift_number, squad_number)
+        sources = self._source_cache.get(key)
+        if sources is None:
+            prefix = self.source_prefix(shift_number, squad_number)
+            try:
+                sources = tuple([obj async for obj in self.list_objects(client, prefix)])
+            except ClientError as e:
+                logger.exception("Error listing %s", prefix)
+                raise ArchiveServiceError(f"Не удалось получить список файлов {prefix}") from e
+            # Пустой список не кэшируем: фотографии могут вот-вот загрузить
+            if sources:
+                self._source_cache.set(key, sources)
+        return sources
+
+    async def _generate_stream_urls(self, shift_number: int, squad_number: int) -> Dict[str, str]:
+        """
+        Ссылки на сборку архивов на лету. Ссылка содержит подписанный токен
+        с номером смены и отряда и живёт столько же, сколько presigned URL.
+        """
+        async with self.get_client() as client:
+            squad_sources, total_sources = await asyncio.gather(
+                self._list_sources(client, shift_number, squad_number),
+                self._list_sources(client, shift_number, None)
+            )
+        targets: tuple[tuple[ArchiveKind, Optional[int], tuple[SourceObject, ...]], ...] = (
+            ("squad_archive", squad_number, squad_sources),
+            ("total_archive", None, total_sources)
+        )
+        missing = [
+            ArchiveCheck(kind=kind, key=self.source_prefix(shift_number, squad))
+            for kind, squad, sources in targets
+            if not sources
+        ]
+        if missing:
+            logger.warning(
+                "Missing photos for shift=%s squad=%s: %s",
+                shift_number,
+                squad_number,
+                ", ".join(check.key for check in missing)
+            )
+            raise ArchiveNotFoundError(missing)
+        return {
+            "squad_archive": self.stream_url(shift_number, squad_number),
+            "total_archive": self.stream_url(shift_number, None)
+        }
+
+    def stream_url(
+        self,
+        shift_number: int,
+        squad_number: Optional[int],
+        expires_in: Optional[int] = None
+    ) -> str:
+        if expires_in is None:
+            expires_in = settings.DOWNLOAD_URL_EXPIRES_SECONDS
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=expires_in)
+        token = jwt.encode(
+            {
+                "scope": ARCHIVE_TOKEN_SCOPE,
+                "shift": shift_number,
+                "squad": squad_number,
+                "exp": expires_at
+            },
+            settings.SECRET_KEY,
+            algorithm=settings.ALGORITHM
+        )
+        return f"{settings.PUBLIC_BASE_URL}/api/media/archives/download?token={token}"
+
+    @staticmethod
+    def decode_stream_token(token: str) -> tuple[int, Optional[int]]:
+        """
+        Проверяет токен ссылки на архив.
+        :return: Номер смены и отряда (None — общий архив)
+        :raises InvalidArchiveTokenError: если токен поддельный или истёк
+        """
+        try:
+            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        except JWTError as e:
+            raise InvalidArchiveTokenError("Ссылка недействительна или истекла") from e
+        if payload.get("scope") != ARCHIVE_TOKEN_SCOPE or not isinstance(payload.get("shift"), int):
+            raise InvalidArchiveTokenError("Ссылка недействительна или истекла")
+        return payload["shift"], payload.get("squad")
+
+    async def stream_archive(self, shift_number: int, squad_number: Optional[int]) -> StreamedArchive:
+        """
+        Готовит ZIP-архив из фотографий смены (или отряда), собираемый при отправке.
+        Файлы читаются range-запросами с ограниченной параллельностью,
+        расход памяти не зависит от размера архива.
+        :raises ArchiveNotFoundError: если под префиксом нет ни одного файла
+        """
+        async with self.get_client() as client:
+            sources = await self._list_sources(client, shift_number, squad_number)
+        prefix = self.source_prefix(shift_number, squad_number)
+        if not sources:
+            kind: ArchiveKind = "total_archive" if squad_number is None else "squad_archive"
+            raise ArchiveNotFoundError([ArchiveCheck(kind=kind, key=prefix)])
+
+        async def content() -> AsyncGenerator[bytes, None]:
+            async with self.get_client() as client:
+                async for chunk in stream_zip(
+                    client,
+                    settings.AWS_BUCKET_NAME,
+                    sources,
+                    prefix,
+                    chunk_size=settings.ARCHIVE_STREAM_CHUNK_SIZE,
+                    concurrency=settings.ARCHIVE_STREAM_CONCURRENCY
+                ):
+                    yield chunk
+
+        suffix = "total" if squad_number is None else squad_number
+        return StreamedArchive(
+            filename=f"{shift_number}_{suffix}.zip",
+            size=zip_size(sources, prefix),
+            content=content()
+        )
+
+    def invalidate_archives(self, shift_number: int, squad_number: Optional[int] = None) -> None:
+        """
+        Сбрасывает кэш наличия архивов после перезаливки.
+        Без номера отряда сбрасывается вся смена (общий архив входит в каждую запись).
+        """
+        if squad_number is not None:
+            self._archive_cache.pop((shift_number, squad_number))
+            self._source_cache.pop((shift_number, squad_number))
+            return
+        caches: tuple[TTLCache[Any, Any], ...] = (self._archive_cache, self._source_cache)
+        for cache in caches:
+            for key in cache.keys():
+                if key[0] == shift_number:
+                    cache.pop(key)
+
+    @staticmethod
+    def squad_archive_key(shift_number: int, squad_number: int) -> str:
+        return f"shifts/{shift_number}_{squad_number}.zip"
+
+    @staticmethod
+    def total_archive_key(shift_number: int) -> str:
+        return f"shifts/{shift_number}_total.zip"
+
+    @staticmethod
+    def source_prefix(shift_number: int, squad_number: Optional[int] = None) -> str:
+        """Папка с фотографиями отряда или общая папка смены (squad_number=None)."""
+        return f"{shift_number}/{'total' if squad_number is None else squad_number}/"
 
 archive_service = ArchiveService() 
\ No newline at end of file
@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import AsyncGenerator, Callable, Iterator, Optional, Sequence
+from aiobotocore.client import AioBaseClient  # type: ignore
+from zipstream import ZIP_DEFLATED, ZIP_STORED, ZipStream  # type: ignore
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Уже сжатые форматы: повторное сжатие только тратит CPU
+STORED_EXTENSIONS = frozenset({
+    ".jpg", ".jpeg", ".png", ".heic", ".webp", ".gif", ".mp4", ".mov", ".zip"
+})
+
+# Синхронный zipstream-ng итерируется в отдельном пуле потоков, а не в общем
+# пуле asyncio.to_thread. Одновременно собирается не больше ARCHIVE_STREAM_WORKERS
+# архивов, у каждого свой поток; остальные ждут свободного слота.
+_zip_executor = ThreadPoolExecutor(
+    max_workers=settings.ARCHIVE_STREAM_WORKERS,
+    thread_name_prefix="zip-stream"
+)
+_zip_slots = asyncio.Semaphore(settings.ARCHIVE_STREAM_WORKERS)
+
+
+@dataclass(frozen=True)
+class SourceObject:
+    """Объект-источник для архива (отдельная фотография в хранилище)."""
+    key: str
+    etag: str
+    size: int
+    last_modified: Optional[datetime] = None
+
+    @classmethod
+    def from_listing(cls, item: dict) -> "SourceObject":
+        return cls(
+            key=item['Key'],
+            etag=item.get('ETag', '').strip('"'),
+            size=item.get('Size', 0),
+            last_modified=item.get('LastModified')
+        )
+
+
+class RangePrefetcher:
+    """
+    Читает объекты последовательными range-запросами фиксированного размера.
+    Одновременно выполняется не больше `concurrency` запросов, поэтому
+    в памяти находится не больше `concurrency` кусков независимо от размера архива.
+    Куски отдаются строго в порядке объектов и смещений.
+    """
+
+    def __init__(
+        self,
+        client: AioBaseClient,
+        bucket: str,
+        objects: Sequence[SourceObject],
+        chunk_size: int,
+        concurrency: int
+    ) -> None:
+        self.client = client
+        self.bucket = bucket
+        self.chunk_size = chunk_size
+        self.concurrency = max(1, concurrency)
+        self._ranges = self._plan(objects)
+        self._pending: deque[asyncio.Task[bytes]] = deque()
+        self._closed = False
+
+    def _plan(self, objects: Sequence[SourceObject]) -> Iterator[tuple[SourceObject, int, int]]:
+        for obj in objects:
+            for start in range(0, obj.size, self.chunk_size):
+                yield obj, start, min(start + self.chunk_size, obj.size) - 1
+
+    def _fill(self) -> None:
+        while not self._closed and len(self._pending) < self.concurrency:
+            item = next(self._ranges, None)
+            if item is None:
+                return
+            self._pending.append(asyncio.ensure_future(self._read(*item)))
+
+    async def _read(self, obj: SourceObject, start: int, end: int) -> bytes:
+        # IfMatch: если фото перезалили во время скачивания, архив не соберётся из разных версий
+        response = await self.client.get_object(
+            Bucket=self.bucket,
+            Key=obj.key,
+            Range=f"bytes={start}-{end}",
+            IfMatch=obj.etag
+        )
+        body = response['Body']
+        try:
+            data: bytes = await body.read()
+        finally:
+            body.close()
+        if len(data) != end - start + 1:
+            raise IOError(f"Короткое чтение {obj.key}: {len(data)} из {end - start + 1} байт")
+        return data
+
+    async def next_chunk(self) -> Optional[bytes]:
+        """Следующий кусок данных или None, когда все объекты прочитаны."""
+        self._fill()
+        if not self._pending:
+            return None
+        task = self._pending.popleft()
+        data = await task
+        self._fill()
+        return data
+
+    def close(self) -> None:
+        self._closed = True
+        while self._pending:
+            self._pending.popleft().cancel()
+
+
+def build_zip(
+    objects: Sequence[SourceObject],
+    prefix: str,
+    read_chunk: Callable[[], Optional[bytes]],
+    compress: bool = False
+) -> ZipStream:
+    """
+    Описывает архив. По умолчанию все файлы без сжатия и с заранее известными
+    размерами, поэтому длина архива известна до отправки.
+    :param read_chunk: Блокирующая функция, возвращающая следующий кусок данных
+    :param compress: Сжимать файлы, кроме STORED_EXTENSIONS (длина архива заранее неизвестна)
+    """
+    def file_data(obj: SourceObject) -> Iterator[bytes]:
+        remaining = obj.size
+        while remaining > 0:
+            chunk = read_chunk()
+            if chunk is None:
+                raise IOError(f"Данные {obj.key} закончились раньше времени")
+            remaining -= len(chunk)
+            yield chunk
+
+    zs = ZipStream(compress_type=ZIP_DEFLATED if compress else ZIP_STORED, sized=not compress)
+    for obj in objects:
+        stored = not compress or os.path.splitext(obj.key)[1].lower() in STORED_EXTENSIONS
+        zs.add(
+            file_data(obj),
+            obj.key[len(prefix):],
+            size=obj.size,
+            compress_type=ZIP_STORED if stored else ZIP_DEFLATED
+        )
+    return zs
+
+
+def zip_size(objects: Sequence[SourceObject], prefix: str) -> int:
+    """Размер архива в байтах (для Content-Length), без чтения данных."""
+    return len(build_zip(objects, prefix, lambda: None))
+
+
+async def stream_zip(
+    client: AioBaseClient,
+    bucket: str,
+    objects: Sequence[SourceObject],
+    prefix: str,
+    chunk_size: int,
+    concurrency: int,
+    compress: bool = False
+) -> AsyncGenerator[bytes, None]:
+    """
+    Собирает ZIP из объектов на лету с постоянным расходом памяти.
+    zipstream-ng синхронный, поэтому архив итерируется в потоке _zip_executor,
+    а данные для него читаются в event loop через RangePrefetcher.
+    """
+    loop = asyncio.get_running_loop()
+    prefetcher = RangePrefetcher(client, bucket, objects, chunk_size, concurrency)
+
+    def read_chunk() -> Optional[bytes]:
+        return asyncio.run_coroutine_threadsafe(prefetcher.next_chunk(), loop).result()
+
+    chunks = iter(build_zip(objects, prefix, read_chunk, compress))
+    try:
+        async with _zip_slots:
+            while True:
+                chunk = await loop.run_in_executor(_zip_executor, next, chunks, None)
+                if chunk is None:
+                    return
+                yield chunk
+    except Exception:
+        logger.exception("Error streaming archive %s", prefix)
+        raise
+    finally:
+        prefetcher.close()
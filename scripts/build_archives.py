@@ -0,0 +1,70 @@
+"""
+Сборка готовых архивов смены из фотографий в хранилище.
+
+Для каждого отряда из {shift}/{squad}/ собирается shifts/{shift}_{squad}.zip,
+из {shift}/total/ — shifts/{shift}_total.zip. Архивы, фотографии которых
+не менялись с прошлой сборки, пропускаются. Если в папке изменилась хотя бы
+одна фотография, архив собирается и загружается заново целиком.
+
+Использование:
+    python scripts/build_archives.py 12
+    python scripts/build_archives.py 12 --squads 1 3 --no-total --force
+"""
+import argparse
+import asyncio
+import sys
+sys.path.append(".")  # Добавляем текущую директорию в PYTHONPATH
+
+from media.archive_builder import PART_SIZE, UPLOAD_CONCURRENCY, ArchiveBuilder
+from media.archive_service import archive_service
+
+
+async def build_archives(args: argparse.Namespace) -> int:
+    async with archive_service.get_client() as client:
+        builder = ArchiveBuilder(
+            client,
+            part_size=args.part_size * 1024 * 1024,
+            upload_concurrency=args.upload_concurrency
+        )
+        squads = args.squads or await builder.discover_squads(args.shift)
+        targets = [*squads, *([] if args.no_total else [None])]
+        if not targets:
+            print(f"Для смены {args.shift} не найдено папок с фотографиями")
+            return 1
+
+        built = 0
+        for squad in targets:
+            result = await builder.build(args.shift, squad, force=args.force)
+            if result.status == "built":
+                built += 1
+                print(
+                    f"{result.key}: собран, файлов {result.files}, "
+                    f"{result.size / 1024 / 1024:.1f} МиБ, частей {result.parts}, "
+                    f"{result.seconds:.1f} с"
+                )
+            elif result.status == "skipped":
+                print(f"{result.key}: фотографии не менялись, пропущен")
+            else:
+                print(f"{result.key}: нет фотографий")
+
+    if built:
+        print(
+            "Приложение держит кэш наличия архивов; чтобы сбросить его сразу, "
+            f"вызовите POST /api/media/archives/{args.shift}/invalidate"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Сборка архивов смены из фотографий",
+        epilog="Неизменённые архивы пропускаются; при любом изменении фотографий "
+               "отряда архив пересобирается и загружается целиком"
+    )
+    parser.add_argument("shift", type=int, help="номер смены")
+    parser.add_argument("--squads", type=int, nargs="*", help="номера отрядов (по умолчанию все найденные)")
+    parser.add_argument("--no-total", action="store_true", help="не собирать общий архив смены")
+    parser.add_argument("--force", action="store_true", help="пересобрать, даже если фотографии не менялись")
+    parser.add_argument("--part-size", type=int, default=PART_SIZE // 1024 // 1024, help="размер части, МиБ (не меньше 5)")
+    parser.add_argument("--upload-concurrency", type=int, default=UPLOAD_CONCURRENCY)
+    sys.exit(asyncio.run(build_archives(parser.parse_args())))
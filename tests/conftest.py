@@ -0,0 +1,67 @@
+import os
+from typing import AsyncIterator
+
+import httpx
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.database import Base
+from app.dependency import get_db
+from app.main import app
+from benchmarks.stubs import FakeS3Client
+from users.models import User
+
+# Тесты с SQL, специфичным для Postgres (FOR UPDATE в CTE, ON CONFLICT, json_agg),
+# запускаются только на отдельной тестовой базе: её таблицы пересоздаются
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+
+@pytest.fixture
+def fake_s3() -> FakeS3Client:
+    """Хранилище в памяти без задержки «сети»."""
+    return FakeS3Client(latency=0)
+
+
+@pytest.fixture
+async def session_factory() -> AsyncIterator[async_sessionmaker[AsyncSession]]:
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL не задан")
+    engine = create_async_engine(TEST_DATABASE_URL, poolclass=NullPool)
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.drop_all)
+        await connection.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, expire_on_commit=False)
+    await engine.dispose()
+
+
+@pytest.fixture
+async def db(session_factory: async_sessionmaker[AsyncSession]) -> AsyncIterator[AsyncSession]:
+    async with session_factory() as session:
+        yield session
+
+
+@pytest.fixture
+async def admin(db: AsyncSession) -> User:
+    user = User(email="admin@example.com", hashed_password="-", is_admin=True)
+    db.add(user)
+    await db.commit()
+    return user
+
+
+
+@pytest.fixture
+async def api(session_factory: async_sessionmaker[AsyncSession]) -> AsyncIterator[httpx.AsyncClient]:
+    """Клиент приложения без lifespan, запросы к базе идут в тестовую базу."""
+    async def get_test_db() -> AsyncIterator[AsyncSession]:
+        async with session_factory() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = get_test_db
+    try:
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            yield client
+    finally:
+        app.dependency_overrides.pop(get_db, None)
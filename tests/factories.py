@@ -0,0 +1,12 @@
+from codes.models import AccessCode
+from users.models import User
+
+
+def make_code(admin: User, code: str, shift: int = 1, squad: int = 1, **values: object) -> AccessCode:
+    return AccessCode(
+        code=code,
+        shift_number=shift,
+        squad_number=squad,
+        created_by_id=admin.id,
+        **values
+    )
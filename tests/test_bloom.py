@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from codes import bloom as bloom_module
+from codes.bloom import BloomFilter, ValidCodeFilter
+from codes.services import CodeGenerator
+from tests.factories import make_code
+from users.models import User
+
+
+def test_no_false_negatives() -> None:
+    codes = CodeGenerator().generate_codes_batch(10_000)
+    bloom = BloomFilter(capacity=10_000, error_rate=0.001)
+    bloom.update(codes)
+    assert all(code in bloom for code in codes)
+
+
+def test_false_positive_rate_is_close_to_target() -> None:
+    generator = CodeGenerator()
+    codes = set(generator.generate_codes_batch(10_000))
+    bloom = BloomFilter(capacity=10_000, error_rate=0.01)
+    bloom.update(codes)
+    probes = [code for code in generator.generate_codes_batch(20_000) if code not in codes]
+    false_positives = sum(code in bloom for code in probes)
+    assert false_positives / len(probes) < 0.03
+
+
+def test_add_reports_new_items() -> None:
+    bloom = BloomFilter(capacity=100, error_rate=0.001)
+    assert bloom.add("ABCDEFGH")
+    assert not bloom.add("ABCDEFGH")
+    assert bloom.count == 1
+
+
+@pytest.fixture
+async def code_filter(
+    session_factory: async_sessionmaker[AsyncSession],
+    monkeypatch: pytest.MonkeyPatch
+) -> ValidCodeFilter:
+    monkeypatch.setattr(bloom_module, "async_session", session_factory)
+    monkeypatch.setattr(settings, "CODE_FILTER_CAPACITY", 1000)
+    monkeypatch.setattr(settings, "CODE_FILTER_MISS_REFRESH_SECONDS", 0)
+    return ValidCodeFilter()
+
+
+async def test_refresh_loads_codes_created_after_build(
+    code_filter: ValidCodeFilter, db: AsyncSession, admin: User
+) -> None:
+    await code_filter.rebuild()
+    db.add(make_code(admin, "FRESH001"))
+    await db.commit()
+
+    await code_filter.refresh()
+
+    assert code_filter._filter is not None and "FRESH001" in code_filter._filter
+
+
+async def test_late_committed_code_is_found_by_lookup_and_rebuild(
+    code_filter: ValidCodeFilter,
+    db: AsyncSession,
+    admin: User,
+    monkeypatch: pytest.MonkeyPatch
+) -> None:
+    await code_filter.rebuild()
+    # created_at — начало транзакции: код из долгой транзакции старше отметки догрузки
+    started = datetime.now(timezone.utc) - timedelta(minutes=10)
+    db.add(make_code(admin, "LATE0001", created_at=started))
+    await db.commit()
+
+    await code_filter.refresh()
+    assert code_filter._filter is not None and "LATE0001" not in code_filter._filter
+
+    monkeypatch.setattr(settings, "CODE_FILTER_MISS_LOOKUPS_PER_SECOND", 0)
+    assert not await code_filter.might_exist("LATE0001")
+    monkeypatch.setattr(settings, "CODE_FILTER_MISS_LOOKUPS_PER_SECOND", 5)
+    assert await code_filter.might_exist("LATE0001")
+    assert "LATE0001" in code_filter._filter
+
+    rebuilt = ValidCodeFilter()
+    await rebuilt.rebuild()
+    assert rebuilt._filter is not None and "LATE0001" in rebuilt._filter
+
+
+async def test_miss_lookups_are_rate_limited(
+    code_filter: ValidCodeFilter,
+    monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "CODE_FILTER_MISS_LOOKUPS_PER_SECOND", 2)
+    await code_filter.rebuild()
+    lookups: list[str] = []
+    original = bloom_module.async_session
+
+    def counting_session() -> AsyncSession:
+        lookups.append("session")
+        return original()
+
+    monkeypatch.setattr(bloom_module, "async_session", counting_session)
+    for i in range(10):
+        assert not await code_filter.might_exist(f"MISS{i:04}")
+    # По сессии на каждую догрузку и только две проверки в базе
+    assert len(lookups) == 10 + 2
+
+
+def test_filter_is_rebuilt_periodically(monkeypatch: pytest.MonkeyPatch) -> None:
+    code_filter = ValidCodeFilter()
+    assert code_filter.needs_rebuild()
+    code_filter._filter = BloomFilter(capacity=10, error_rate=0.01)
+    code_filter._built_at = bloom_module.time.monotonic()
+    assert not code_filter.needs_rebuild()
+    monkeypatch.setattr(settings, "CODE_FILTER_REBUILD_SECONDS", 0)
+    assert code_filter.needs_rebuild()
@@ -0,0 +1,34 @@
+from app.core.cache import TTLCache
+
+
+def test_get_returns_stored_value() -> None:
+    cache: TTLCache[str, int] = TTLCache(ttl=60)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    assert cache.get("missing") is None
+
+
+def test_expired_entry_is_dropped() -> None:
+    cache: TTLCache[str, int] = TTLCache(ttl=60)
+    cache.set("a", 1, ttl=0)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted() -> None:
+    cache: TTLCache[str, int] = TTLCache(ttl=60, maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert list(cache.keys()) == ["a", "c"]
+
+
+def test_pop_and_clear() -> None:
+    cache: TTLCache[str, int] = TTLCache(ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.pop("a") == 1
+    assert cache.pop("a") is None
+    cache.clear()
+    assert len(cache) == 0
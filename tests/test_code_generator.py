@@ -0,0 +1,21 @@
+from codes.services import CodeGenerator
+
+
+def test_batch_has_requested_count_and_length() -> None:
+    generator = CodeGenerator(length=8)
+    codes = generator.generate_codes_batch(1000)
+    assert len(codes) == 1000
+    assert all(len(code) == 8 for code in codes)
+
+
+def test_batch_uses_only_unambiguous_alphabet() -> None:
+    generator = CodeGenerator(length=12)
+    used = set("".join(generator.generate_codes_batch(2000)))
+    assert used <= set(generator.alphabet)
+    assert not used & set("0Oo1IiLl")
+    # 24 000 символов: каждый символ алфавита должен встретиться
+    assert used == set(generator.alphabet)
+
+
+def test_empty_batch() -> None:
+    assert CodeGenerator().generate_codes_batch(0) == []
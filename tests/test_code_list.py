@@ -0,0 +1,110 @@
+import json
+from datetime import datetime, timezone
+from typing import Optional
+
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from codes.crud import (
+    _count_cache,
+    after_cursor,
+    count_codes,
+    decode_cursor,
+    encode_cursor,
+    get_shift_promocodes_json
+)
+from codes.enums import TotalCountMode
+from codes.models import AccessCode
+from codes.schemas import AccessCodeResponse, ShiftPromocodesResponse, SquadPromocodes
+from tests.factories import make_code
+from users.models import User
+
+
+def test_cursor_round_trip() -> None:
+    created_at = datetime(2026, 7, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+    cursor = encode_cursor(created_at, 42)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (created_at, 42)
+
+
+@pytest.mark.parametrize("cursor", ["", "not-a-cursor", "W10", "WyJ4IiwgMV0"])
+def test_invalid_cursor_raises_value_error(cursor: str) -> None:
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+async def test_after_cursor_walks_all_codes_once(db: AsyncSession, admin: User) -> None:
+    # Все коды одной транзакции получают одинаковый created_at: порядок решает id
+    db.add_all([make_code(admin, f"PAGE{number:04}") for number in range(25)])
+    await db.commit()
+
+    query = select(AccessCode).order_by(AccessCode.created_at, AccessCode.id)
+    seen: list[str] = []
+    cursor: Optional[str] = None
+    while True:
+        page_query = after_cursor(query, cursor) if cursor else query
+        page = (await db.execute(page_query.limit(10))).scalars().all()
+        if not page:
+            break
+        seen.extend(code.code for code in page)
+        cursor = encode_cursor(page[-1].created_at, page[-1].id)
+
+    assert seen == [f"PAGE{number:04}" for number in range(25)]
+
+
+async def test_estimated_count_falls_back_to_exact_and_cache(db: AsyncSession, admin: User) -> None:
+    _count_cache.clear()
+    db.add_all([make_code(admin, f"CNT{number:05}", is_used=number < 4) for number in range(10)])
+    await db.commit()
+    unfiltered = select(AccessCode)
+    used = select(AccessCode).where(AccessCode.is_used.is_(True))
+
+    # Таблица ещё не анализировалась (reltuples = -1): считаем точно
+    assert await count_codes(db, unfiltered, TotalCountMode.ESTIMATED, cache_key=("all",)) == 10
+    assert await count_codes(db, used, TotalCountMode.ESTIMATED, cache_key=("used",)) == 4
+
+    db.add(make_code(admin, "CNT99999", is_used=True))
+    await db.commit()
+
+    # С фильтром ESTIMATED отдаёт недавно посчитанное значение, EXACT считает заново
+    assert await count_codes(db, used, TotalCountMode.ESTIMATED, cache_key=("used",)) == 4
+    assert await count_codes(db, used, TotalCountMode.EXACT, cache_key=("used",)) == 5
+    assert await count_codes(db, used, TotalCountMode.NONE, cache_key=("used",)) is None
+
+    await db.execute(text("ANALYZE access_code"))
+    assert await count_codes(db, unfiltered, TotalCountMode.ESTIMATED, cache_key=("all",)) == 11
+
+
+async def test_shift_promocodes_json_matches_response_model(db: AsyncSession, admin: User) -> None:
+    db.add_all([
+        make_code(admin, "SHIFT001", shift=4, squad=2),
+        make_code(
+            admin, "SHIFT002", shift=4, squad=1, is_used=True, full_name="Иван Петров",
+            used_at=datetime(2026, 7, 1, 12, 30, 15, tzinfo=timezone.utc), usage_data={"shift": 4}
+        ),
+        make_code(
+            admin, "SHIFT003", shift=4, squad=1, is_used=True,
+            used_at=datetime(2026, 7, 1, 12, 30, 15, 120000, tzinfo=timezone.utc)
+        ),
+        make_code(admin, "OTHER001", shift=5, squad=1),
+    ])
+    await db.commit()
+
+    content = await get_shift_promocodes_json(db, 4)
+
+    codes = (await db.scalars(
+        select(AccessCode).where(AccessCode.shift_number == 4).order_by(AccessCode.id)
+    )).all()
+    expected = ShiftPromocodesResponse(
+        shift_number=4,
+        squads=[
+            SquadPromocodes(
+                squad_number=squad,
+                promocodes=[AccessCodeResponse.model_validate(code) for code in codes if code.squad_number == squad]
+            )
+            for squad in (1, 2)
+        ]
+    )
+    assert json.loads(content) == json.loads(expected.model_dump_json())
+    assert ShiftPromocodesResponse.model_validate_json(content) == expected
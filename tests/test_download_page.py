@@ -0,0 +1,37 @@
+import json
+import re
+
+import pytest
+
+from codes.download_page import prefers_json, render_download_page
+
+
+@pytest.mark.parametrize(
+    ("accept", "expected"),
+    [
+        ("application/json", True),
+        ("text/html", False),
+        ("", False),
+        ("*/*", False),
+        ("text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8", False),
+        ("application/json, text/html;q=0.5", True),
+        ("text/html;q=0.9, application/json;q=0.9", False),
+        ("application/json;q=abc, text/html;q=0.1", False),
+    ],
+)
+def test_prefers_json(accept: str, expected: bool) -> None:
+    assert prefers_json(accept) is expected
+
+
+def test_render_escapes_urls_inside_script() -> None:
+    urls = {
+        "squad_archive": "https://s3.local/a.zip?x=1&y=</script><script>alert(1)</script>",
+        "total_archive": "https://s3.local/b.zip?<!--",
+    }
+    page = render_download_page(urls)
+
+    assert page.count("</script>") == 1
+    assert "<!--" not in page
+    embedded = re.search(r"const urls = (.*);", page)
+    assert embedded is not None
+    assert json.loads(embedded.group(1)) == urls
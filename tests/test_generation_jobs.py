@@ -0,0 +1,104 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator
+
+import pytest
+
+import codes.jobs
+from codes.enums import JobStatus
+from codes.jobs import GenerationJobManager
+from codes.models import AccessCode
+from codes.services import CodeGenerationResult, CodeSpaceExhaustedError
+from users.schemas import Principal
+
+ADMIN = Principal(
+    id=1,
+    email="admin@example.com",
+    is_admin=True,
+    created_at=datetime(2026, 1, 1, tzinfo=timezone.utc),
+)
+
+
+class FakeGenerator:
+    def __init__(self, fail_on_squad: int | None = None, error: Exception | None = None) -> None:
+        self.calls: list[tuple[int, int]] = []
+        self.fail_on_squad = fail_on_squad
+        self.error = error
+
+    async def generate_codes(self, count: int, squad_number: int, **kwargs: Any) -> CodeGenerationResult:
+        self.calls.append((squad_number, count))
+        if squad_number == self.fail_on_squad:
+            raise self.error or RuntimeError("boom")
+        codes = [AccessCode(code=f"S{squad_number}N{number}") for number in range(count)]
+        return CodeGenerationResult(requested=count, codes=codes, collisions=1)
+
+
+@asynccontextmanager
+async def fake_session() -> AsyncIterator[None]:
+    yield None
+
+
+@pytest.fixture
+def generator(monkeypatch: pytest.MonkeyPatch) -> FakeGenerator:
+    fake = FakeGenerator()
+    monkeypatch.setattr(codes.jobs, "code_generator", fake)
+    monkeypatch.setattr(codes.jobs, "async_session", fake_session)
+    monkeypatch.setattr(codes.jobs, "JOB_CHUNK_SIZE", 4)
+    return fake
+
+
+async def finished(manager: GenerationJobManager, job_id: str) -> codes.jobs.GenerationJob:
+    await asyncio.gather(*manager._tasks.values())
+    job = manager.get(job_id)
+    assert job is not None
+    return job
+
+
+async def test_plan_is_generated_in_chunks(generator: FakeGenerator) -> None:
+    manager = GenerationJobManager()
+    job = manager.submit(shift_number=3, plan={2: 10, 1: 4}, user=ADMIN)
+
+    job = await finished(manager, job.id)
+
+    assert generator.calls == [(1, 4), (2, 4), (2, 4), (2, 2)]
+    assert job.status is JobStatus.COMPLETED
+    assert job.generated == job.total == 14
+    assert job.collisions == 4
+    assert job.current_squad is None and job.finished_at is not None
+
+
+async def test_failure_keeps_progress_and_message(generator: FakeGenerator) -> None:
+    generator.fail_on_squad = 2
+    generator.error = CodeSpaceExhaustedError("Не удалось сгенерировать 4 уникальных кодов")
+    manager = GenerationJobManager()
+    job = manager.submit(shift_number=3, plan={1: 6, 2: 4, 3: 4}, user=ADMIN)
+
+    job = await finished(manager, job.id)
+
+    assert job.status is JobStatus.FAILED
+    assert job.generated == 6
+    assert job.error == "Отряд 2: Не удалось сгенерировать 4 уникальных кодов"
+    assert (3, 4) not in generator.calls
+
+
+async def test_unexpected_error_fails_the_job(generator: FakeGenerator) -> None:
+    generator.fail_on_squad = 1
+    manager = GenerationJobManager()
+    job = manager.submit(shift_number=3, plan={1: 1}, user=ADMIN)
+
+    job = await finished(manager, job.id)
+
+    assert job.status is JobStatus.FAILED
+    assert job.error == "boom"
+
+
+async def test_old_finished_jobs_are_forgotten(generator: FakeGenerator) -> None:
+    manager = GenerationJobManager(max_finished_jobs=2)
+    ids = []
+    for _ in range(4):
+        job = manager.submit(shift_number=3, plan={1: 1}, user=ADMIN)
+        await finished(manager, job.id)
+        ids.append(job.id)
+
+    assert [job.id for job in manager.list_jobs()] == list(reversed(ids[1:]))
@@ -0,0 +1,192 @@
+import math
+from typing import Any, Optional
+
+import httpx
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from starlette.requests import Request
+
+from app.core.config import settings
+from app.core.rate_limit import (
+    InMemoryRateLimitBackend,
+    RateLimit,
+    RateLimiter,
+    RateLimitExceeded,
+    SharedRateLimitBackend,
+    client_ip,
+    rate_limiter,
+    take_token
+)
+from benchmarks.stubs import FakeRedis
+from codes import crud
+from tests.factories import make_code
+from users.models import User
+
+LIMIT = RateLimit.per_minute(capacity=3, per_minute=60)
+
+
+def test_full_bucket_allows_burst_up_to_capacity() -> None:
+    tokens, now = LIMIT.capacity, 0.0
+    for _ in range(3):
+        tokens, result = take_token(tokens, now, now, LIMIT)
+        assert result.allowed
+    tokens, result = take_token(tokens, now, now, LIMIT)
+    assert not result.allowed
+    assert result.retry_after == pytest.approx(1.0)
+
+
+def test_tokens_refill_over_time_up_to_capacity() -> None:
+    tokens, result = take_token(0.0, 0.0, 1.5, LIMIT)
+    assert result.allowed
+    assert tokens == pytest.approx(0.5)
+    tokens, _ = take_token(0.0, 0.0, 3600.0, LIMIT)
+    assert tokens == pytest.approx(LIMIT.capacity - 1)
+
+
+def test_clock_going_backwards_does_not_add_tokens() -> None:
+    tokens, result = take_token(0.0, 10.0, 5.0, LIMIT)
+    assert not result.allowed
+    assert tokens == 0.0
+
+
+def test_no_refill_means_infinite_retry_after() -> None:
+    _, result = take_token(0.0, 0.0, 100.0, RateLimit(capacity=1, refill_per_second=0))
+    assert not result.allowed
+    assert math.isinf(result.retry_after)
+
+
+def test_retry_after_header_is_rounded_up() -> None:
+    assert RateLimitExceeded("use:ip:1", 0.2).retry_after_header == "1"
+    assert RateLimitExceeded("use:ip:1", 2.1).retry_after_header == "3"
+
+
+async def test_in_memory_backend_evicts_least_recently_used_bucket() -> None:
+    backend = InMemoryRateLimitBackend(maxsize=2)
+    single = RateLimit(capacity=1, refill_per_second=0)
+    assert (await backend.consume("a", single)).allowed
+    assert (await backend.consume("b", single)).allowed
+    assert not (await backend.consume("a", single)).allowed  # a снова самая свежая
+    assert (await backend.consume("c", single)).allowed  # вытесняет b
+
+    assert not (await backend.consume("a", single)).allowed
+    assert (await backend.consume("b", single)).allowed  # b начинает с полной корзины
+
+
+async def test_limiter_follows_rate_limit_enabled(monkeypatch: pytest.MonkeyPatch) -> None:
+    limiter = RateLimiter(InMemoryRateLimitBackend())
+    rule = ("k", RateLimit(capacity=1, refill_per_second=0))
+    await limiter.check(rule)
+
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", False)
+    await limiter.check(rule)
+    with pytest.raises(RateLimitExceeded):
+        await RateLimiter(limiter.backend, enabled=True).check(rule)
+
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", True)
+    with pytest.raises(RateLimitExceeded):
+        await limiter.check(rule)
+
+
+async def test_shared_backend_runs_the_bucket_in_the_store() -> None:
+    backend = SharedRateLimitBackend(FakeRedis())
+    limit = RateLimit.per_minute(capacity=2, per_minute=60)
+    assert (await backend.consume("k", limit)).allowed
+    assert (await backend.consume("k", limit)).allowed
+    result = await backend.consume("k", limit)
+    assert not result.allowed
+    assert 0 < result.retry_after <= 1
+
+
+async def test_shared_backend_fails_open() -> None:
+    class Unavailable:
+        async def eval(self, *args: Any) -> list:
+            raise ConnectionError("redis down")
+
+    result = await SharedRateLimitBackend(Unavailable()).consume("k", LIMIT)
+    assert result.allowed
+
+
+def make_request(forwarded: Optional[str] = None, host: str = "10.0.0.1") -> Request:
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded is not None else []
+    return Request({"type": "http", "headers": headers, "client": (host, 1234)})
+
+
+@pytest.mark.parametrize(
+    ("proxies", "forwarded", "expected"),
+    [
+        (0, "203.0.113.7", "10.0.0.1"),
+        (1, "203.0.113.7", "203.0.113.7"),
+        (1, "198.51.100.1, 203.0.113.7", "203.0.113.7"),
+        (2, "198.51.100.1, 203.0.113.7", "198.51.100.1"),
+        (2, "203.0.113.7", "10.0.0.1"),
+        (1, None, "10.0.0.1"),
+    ],
+)
+def test_client_ip_trusts_only_configured_proxies(
+    monkeypatch: pytest.MonkeyPatch, proxies: int, forwarded: Optional[str], expected: str
+) -> None:
+    monkeypatch.setattr(settings, "TRUSTED_PROXY_COUNT", proxies)
+    assert client_ip(make_request(forwarded)) == expected
+
+
+@pytest.fixture
+def fresh_limits(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(rate_limiter, "backend", InMemoryRateLimitBackend())
+    crud._code_used_cache.clear()
+
+
+def count_status_queries(session_factory: async_sessionmaker[AsyncSession]) -> list[str]:
+    """Запросы is_code_used к базе, выполненные приложением."""
+    statements: list[str] = []
+
+    @event.listens_for(session_factory.kw["bind"].sync_engine, "before_cursor_execute")
+    def collect(conn: Any, cursor: Any, statement: str, *args: Any) -> None:
+        if statement.lstrip().startswith("SELECT access_code.is_used"):
+            statements.append(statement)
+
+    return statements
+
+
+async def attempt(api: httpx.AsyncClient, code: str) -> httpx.Response:
+    payload = {"name": "Иван", "surname": "Петров", "shift": 3, "group": 1, "promocode": code, "agree": True}
+    return await api.post(f"/api/codes/{code}/use", json=payload, headers={"Accept": "application/json"})
+
+
+async def test_exhausted_code_gets_429_with_retry_after(
+    api: httpx.AsyncClient,
+    db: AsyncSession,
+    admin: User,
+    session_factory: async_sessionmaker[AsyncSession],
+    fresh_limits: None
+) -> None:
+    db.add(make_code(admin, "LIMIT001", shift=9, squad=1))
+    await db.commit()
+    queries = count_status_queries(session_factory)
+
+    statuses = [(await attempt(api, "LIMIT001")).status_code for _ in range(settings.RATE_LIMIT_CODE_CAPACITY)]
+    rejected = [await attempt(api, "LIMIT001") for _ in range(3)]
+
+    assert 429 not in statuses
+    assert all(response.status_code == 429 for response in rejected)
+    assert rejected[0].headers["Retry-After"] == str(math.ceil(60 / settings.RATE_LIMIT_CODE_PER_MINUTE))
+    # Статус кода проверяется в базе один раз, дальше берётся из кеша
+    assert len(queries) == 1
+
+
+async def test_used_code_bypasses_the_code_limit(
+    api: httpx.AsyncClient,
+    db: AsyncSession,
+    admin: User,
+    session_factory: async_sessionmaker[AsyncSession],
+    fresh_limits: None
+) -> None:
+    db.add(make_code(admin, "LIMIT002", shift=3, squad=1, is_used=True, usage_data={}))
+    await db.commit()
+    queries = count_status_queries(session_factory)
+
+    responses = [await attempt(api, "LIMIT002") for _ in range(settings.RATE_LIMIT_CODE_CAPACITY + 3)]
+
+    assert all(response.status_code != 429 for response in responses)
+    assert len(queries) == 1
@@ -0,0 +1,143 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from benchmarks.stubs import FakeS3Client
+from codes.api.v1 import _form_fingerprint, _replay_expires_in
+from codes.crud import claim_access_code
+from codes.enums import RedemptionStatus
+from codes.models import AccessCode
+from codes.schemas import FormData
+from media.archive_service import archive_service
+from tests.factories import make_code
+from users.models import User
+
+VALUES = {"is_used": True, "used_at": datetime(2026, 7, 1, tzinfo=timezone.utc), "usage_data": {"n": 1}}
+
+
+async def test_claim_outcomes(db: AsyncSession, admin: User) -> None:
+    db.add_all([
+        make_code(admin, "FREE0001", shift=1, squad=2),
+        make_code(admin, "USED0001", shift=1, squad=2, is_used=True, usage_data={"n": 0}),
+    ])
+    await db.commit()
+
+    missing = await claim_access_code(db, "NOPE0001", 1, 2, VALUES)
+    assert missing.status is RedemptionStatus.NOT_FOUND
+
+    wrong = await claim_access_code(db, "FREE0001", 1, 3, VALUES)
+    assert wrong.status is RedemptionStatus.WRONG_SHIFT
+    await db.rollback()
+
+    used = await claim_access_code(db, "USED0001", 1, 2, VALUES)
+    assert used.status is RedemptionStatus.ALREADY_USED
+    assert used.usage_data == {"n": 0}
+    await db.rollback()
+
+    claimed = await claim_access_code(db, "FREE0001", 1, 2, VALUES)
+    assert claimed.status is RedemptionStatus.CLAIMED
+    await db.commit()
+
+    row = await db.scalar(select(AccessCode).where(AccessCode.code == "FREE0001"))
+    assert row is not None
+    assert row.is_used and row.usage_data == {"n": 1}
+    again = await claim_access_code(db, "FREE0001", 1, 2, VALUES)
+    assert again.status is RedemptionStatus.ALREADY_USED
+    assert again.access_code_id == claimed.access_code_id
+
+
+async def test_wrong_shift_does_not_claim(db: AsyncSession, admin: User) -> None:
+    db.add(make_code(admin, "FREE0002", shift=5, squad=1))
+    await db.commit()
+
+    result = await claim_access_code(db, "FREE0002", 6, 1, VALUES)
+    await db.commit()
+
+    assert result.status is RedemptionStatus.WRONG_SHIFT
+    assert await db.scalar(select(AccessCode.is_used).where(AccessCode.code == "FREE0002")) is False
+
+
+async def test_disabled_downloads_do_not_touch_the_code(
+    api: httpx.AsyncClient,
+    db: AsyncSession,
+    admin: User,
+    monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "DOWNLOADS_ENABLED", False)
+    db.add(make_code(admin, "FREE0003", shift=2, squad=4))
+    await db.commit()
+    # Строка заблокирована другой транзакцией: запрос не должен её ждать
+    await db.execute(select(AccessCode).where(AccessCode.code == "FREE0003").with_for_update())
+
+    response = await asyncio.wait_for(api.post("/api/codes/FREE0003/use", json={
+        "name": "Иван",
+        "surname": "Петров",
+        "shift": 2,
+        "group": 4,
+        "promocode": "FREE0003",
+        "agree": True,
+    }), timeout=5)
+    await db.rollback()
+
+    assert response.status_code == 503
+    row = await db.scalar(select(AccessCode).where(AccessCode.code == "FREE0003"))
+    assert row is not None
+    assert row.is_used is False and row.usage_data is None
+
+
+def form(code: str, **changes: object) -> FormData:
+    values = {"name": "Иван", "surname": "Петров", "shift": 8, "group": 2, "promocode": code, "agree": True}
+    return FormData(**{**values, **changes})
+
+
+def test_fingerprint_ignores_case_and_spaces() -> None:
+    assert _form_fingerprint(form("ABCD2345")) == _form_fingerprint(
+        form(" ABCD2345 ", name=" иван ", surname="ПЕТРОВ")
+    )
+    assert _form_fingerprint(form("ABCD2345")) != _form_fingerprint(form("ABCD2345", group=3))
+
+
+def test_replay_expires_in() -> None:
+    fingerprint = _form_fingerprint(form("ABCD2345"))
+    expires_at = datetime.now(timezone.utc) + timedelta(seconds=600)
+    usage_data = {"request_fingerprint": fingerprint, "download_expires_at": expires_at.isoformat()}
+
+    assert 590 < (_replay_expires_in(usage_data, fingerprint) or 0) <= 600
+    assert _replay_expires_in(usage_data, "other") is None
+    assert _replay_expires_in(None, fingerprint) is None
+    assert _replay_expires_in({"request_fingerprint": fingerprint}, fingerprint) is None
+    expired = {**usage_data, "download_expires_at": (expires_at - timedelta(hours=1)).isoformat()}
+    assert _replay_expires_in(expired, fingerprint) is None
+
+
+async def test_retried_form_replays_the_links(
+    api: httpx.AsyncClient,
+    db: AsyncSession,
+    admin: User,
+    fake_s3: FakeS3Client,
+    monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "DOWNLOADS_ENABLED", True)
+    monkeypatch.setattr(archive_service, "_client", fake_s3)
+    fake_s3.put(archive_service.squad_archive_key(8, 2), b"squad")
+    fake_s3.put(archive_service.total_archive_key(8), b"total")
+    db.add(make_code(admin, "REPLAY01", shift=8, squad=2))
+    await db.commit()
+    headers = {"Accept": "application/json"}
+
+    first = await api.post("/api/codes/REPLAY01/use", json=form("REPLAY01").model_dump(), headers=headers)
+    retry = await api.post("/api/codes/REPLAY01/use", json=form("REPLAY01").model_dump(), headers=headers)
+    other = await api.post(
+        "/api/codes/REPLAY01/use", json=form("REPLAY01", name="Пётр").model_dump(), headers=headers
+    )
+
+    assert first.status_code == 200 and retry.status_code == 200
+    assert retry.json()["expires_in"] <= first.json()["expires_in"]
+    assert retry.json()["squad_archive"].split("?")[0] == first.json()["squad_archive"].split("?")[0]
+    assert other.status_code == 400
+    assert fake_s3.calls.get("head_object") == 2
@@ -0,0 +1,53 @@
+import pytest
+from aiobotocore.session import get_session  # type: ignore
+from botocore.awsrequest import AWSResponse  # type: ignore
+
+from app.core.metrics import S3_OPERATION_DURATION
+from media.archive_service import ArchiveService, s3_call_result
+
+
+@pytest.mark.parametrize(
+    ("status", "expected"),
+    [(200, "ok"), (204, "ok"), (404, "not_found"), (403, "client_error"),
+     (503, "error"), (None, "error")],
+)
+def test_s3_call_result(status: int | None, expected: str) -> None:
+    assert s3_call_result(status) == expected
+
+
+def observed(operation: str, result: str) -> int:
+    counts, _ = S3_OPERATION_DURATION._values.get((operation, result), ([0], [0.0]))
+    return sum(counts)
+
+
+async def test_head_object_miss_is_labeled_not_found() -> None:
+    # Эмулируем события aiobotocore так же, как их шлёт _make_api_call:
+    # after-call приходит и для 404, ClientError поднимается уже после него
+    session = get_session()
+    async with session.create_client(
+        "s3", region_name="us-east-1",
+        aws_access_key_id="test", aws_secret_access_key="test",
+    ) as client:
+        ArchiveService._instrument(client)
+        events = client.meta.events
+        model = client.meta.service_model.operation_model("HeadObject")
+        before = {result: observed("HeadObject", result) for result in ("ok", "not_found", "error")}
+
+        for status in (404, 200):
+            context: dict = {}
+            await events.emit("before-call.s3.HeadObject", model=model, context=context, params={})
+            await events.emit(
+                "after-call.s3.HeadObject",
+                http_response=AWSResponse("https://s3.local", status, {}, None),
+                parsed={}, model=model, context=context,
+            )
+
+        context = {}
+        await events.emit("before-call.s3.HeadObject", model=model, context=context, params={})
+        await events.emit(
+            "after-call-error.s3.HeadObject", exception=ConnectionError(), context=context
+        )
+
+    assert observed("HeadObject", "not_found") == before["not_found"] + 1
+    assert observed("HeadObject", "ok") == before["ok"] + 1
+    assert observed("HeadObject", "error") == before["error"] + 1
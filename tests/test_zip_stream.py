@@ -0,0 +1,65 @@
+import hashlib
+import io
+import zipfile
+from typing import Any
+
+import pytest
+from botocore.exceptions import ClientError  # type: ignore
+
+from benchmarks.stubs import FakeS3Client
+from media.zip_stream import SourceObject, stream_zip, zip_size
+
+PREFIX = "7/3/"
+
+
+def put_photos(s3: FakeS3Client, sizes: list[int]) -> list[SourceObject]:
+    objects = []
+    for number, size in enumerate(sizes):
+        key = f"{PREFIX}photo_{number}.jpg"
+        body = bytes([number % 256]) * size
+        s3.put(key, body)
+        objects.append(SourceObject(key=key, etag=hashlib.md5(body).hexdigest(), size=size))
+    return objects
+
+
+async def read_all(s3: FakeS3Client, objects: list[SourceObject], **kwargs: Any) -> bytes:
+    chunks = stream_zip(s3, "bucket", objects, PREFIX, chunk_size=4096, concurrency=3, **kwargs)
+    return b"".join([chunk async for chunk in chunks])
+
+
+async def test_streamed_archive_matches_precomputed_size(fake_s3: FakeS3Client) -> None:
+    objects = put_photos(fake_s3, [0, 1, 4096, 10_000, 65_537])
+
+    data = await read_all(fake_s3, objects)
+
+    assert len(data) == zip_size(objects, PREFIX)
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == [obj.key[len(PREFIX):] for obj in objects]
+        for obj in objects:
+            assert archive.read(obj.key[len(PREFIX):]) == fake_s3.objects[obj.key]
+
+
+async def test_compressed_archive_round_trip(fake_s3: FakeS3Client) -> None:
+    objects = put_photos(fake_s3, [5000, 20_000])
+    fake_s3.put(f"{PREFIX}notes.txt", b"squad notes\n" * 1000)
+    objects.append(SourceObject(
+        key=f"{PREFIX}notes.txt",
+        etag=hashlib.md5(fake_s3.objects[f"{PREFIX}notes.txt"]).hexdigest(),
+        size=len(fake_s3.objects[f"{PREFIX}notes.txt"]),
+    ))
+
+    data = await read_all(fake_s3, objects, compress=True)
+
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.getinfo("notes.txt").compress_type == zipfile.ZIP_DEFLATED
+        assert archive.getinfo("photo_0.jpg").compress_type == zipfile.ZIP_STORED
+        assert archive.read("notes.txt") == fake_s3.objects[f"{PREFIX}notes.txt"]
+
+
+async def test_changed_source_fails_the_stream(fake_s3: FakeS3Client) -> None:
+    objects = put_photos(fake_s3, [10_000])
+    fake_s3.put(objects[0].key, b"re-uploaded" * 1000)
+
+    with pytest.raises(ClientError):
+        await read_all(fake_s3, objects)
@@ -8,9 +8,11 @@ from users.services import (
     create_access_token,
     get_current_user,
     create_user,
-    get_user_by_email
+    get_user_by_email,
+    update_user
 )
-from users.schemas import Token, UserCreate, UserResponse
+from users.models import User
+from users.schemas import Principal, Token, UserCreate, UserResponse, UserUpdate
 from app.core.config import settings
 
 router = APIRouter(prefix="/users", tags=["users"])
@@ -44,7 +46,7 @@ async def login(
 @router.post("/create", response_model=UserResponse)
 async def create_new_user(
     user_data: UserCreate,
-    current_user: UserResponse = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -73,9 +75,44 @@ async def create_new_user(
     
     return user
 
+@router.patch("/{user_id}", response_model=UserResponse)
+async def update_existing_user(
+    user_id: int,
+    user_data: UserUpdate,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+) -> User:
+    """
+    Изменение пользователя, в том числе блокировка (только для администраторов).
+    """
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Только администраторы могут изменять пользователей"
+        )
+
+    user = await db.get(User, user_id)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Пользователь не найден"
+        )
+
+    # null в PATCH означает «не менять»: столбцы пользователя не допускают NULL
+    changes = user_data.model_dump(exclude_unset=True, exclude_none=True)
+    if "email" in changes and changes["email"] != user.email:
+        if await get_user_by_email(changes["email"], db):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Пользователь с таким email уже существует"
+            )
+
+    # Кэш текущего пользователя сбрасывается после коммита (см. users.services)
+    return await update_user(db, user, **changes)
+
 @router.get("/me", response_model=UserResponse)
 async def read_users_me(
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     Получение информации о текущем пользователе.
@@ -33,6 +33,16 @@ class UserResponse(UserBase):
     class Config:
         from_attributes = True
 
+class Principal(UserBase):
+    """Данные текущего пользователя, достаточные для проверки прав (кэшируются)."""
+    id: int
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+        frozen = True
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -1,11 +1,16 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import Connection, select, event, inspect
+from sqlalchemy.orm import Mapper, Session
 from users.models import User
+from users.schemas import Principal
 from app.core.config import settings
+from app.core.cache import TTLCache
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from app.dependency import get_db
@@ -13,12 +18,63 @@ from app.dependency import get_db
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/users/login")
 
+# Кэш текущих пользователей по email: авторизованные запросы не ходят в базу
+# за is_admin/is_active. Изменение пользователя через ORM сбрасывает запись после коммита.
+_principal_cache: TTLCache[str, Principal] = TTLCache(
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+    maxsize=settings.PRINCIPAL_CACHE_MAX_SIZE
+)
+
+def invalidate_principal(email: str) -> None:
+    _principal_cache.pop(email)
+
+_PENDING_INVALIDATION_KEY = "invalidate_principals"
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _collect_changed_user(mapper: Mapper[User], connection: Connection, target: User) -> None:
+    # Во время flush изменение ещё не зафиксировано: запоминаем email в сессии,
+    # а кэш сбрасываем после коммита, иначе параллельный запрос успеет закэшировать
+    # старые данные. При смене email сбрасываем и старую запись
+    session = inspect(target).session
+    if session is None:
+        return
+    history = inspect(target).attrs.email.history
+    pending = session.info.setdefault(_PENDING_INVALIDATION_KEY, set())
+    pending.update(email for email in (*history.deleted, target.email) if email)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_users(session: Session) -> None:
+    for email in session.info.pop(_PENDING_INVALIDATION_KEY, ()):
+        invalidate_principal(email)
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back_users(session: Session) -> None:
+    session.info.pop(_PENDING_INVALIDATION_KEY, None)
+
+# bcrypt занимает десятки миллисекунд CPU: считаем его в отдельном пуле потоков,
+# чтобы вход пользователей не блокировал event loop (и активацию промокодов)
+_password_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="password-hash"
+)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _password_executor, verify_password, plain_password, hashed_password
+    )
+
+async def get_password_hash_async(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_password_executor, get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     if expires_delta:
@@ -41,12 +97,12 @@ async def authenticate_user(email: str, password: str, db: AsyncSession) -> Opti
         return None
     if not user.is_active:
         return None
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password_async(password, user.hashed_password):
         return None
     return user
 
 async def create_user(db: AsyncSession, email: str, password: str, is_admin: bool = False) -> User:
-    hashed_password = get_password_hash(password)
+    hashed_password = await get_password_hash_async(password)
     user = User(
         email=email,
         hashed_password=hashed_password,
@@ -57,10 +113,20 @@ async def create_user(db: AsyncSession, email: str, password: str, is_admin: boo
     await db.refresh(user)
     return user
 
+async def update_user(db: AsyncSession, user: User, **changes: object) -> User:
+    password = changes.pop("password", None)
+    if password:
+        user.hashed_password = await get_password_hash_async(str(password))
+    for field, value in changes.items():
+        setattr(user, field, value)
+    await db.commit()
+    await db.refresh(user)
+    return user
+
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: AsyncSession = Depends(get_db)
-) -> User:
+) -> Principal:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -74,9 +140,16 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
     
+    principal = _principal_cache.get(email)
+    if principal is not None:
+        return principal
+
     user = await get_user_by_email(email, db)
     if user is None:
         raise credentials_exception
     if not user.is_active:
         raise credentials_exception
-    return user 
\ No newline at end of file
+
+    principal = Principal.model_validate(user)
+    _principal_cache.set(email, principal)
+    return principal 
\ No newline at end of file